@@ -1,11 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
+from typing import List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from google import genai
-import numpy as np
+from google.genai import types
+from index_backend import open_index
+import profiling
+import threading
+import base64
+import json
+import time
 import uuid
+import contextvars
 import os
 
 # --------------------------
@@ -15,25 +25,105 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 client = genai.Client(api_key=GEMINI_API_KEY)
 MODEL = "gemini-2.5-flash"
 
+# End-to-end /chat latency budget; the LLM gets what retrieval leaves,
+# minus a reserve for building the fallback answer.
+CHAT_BUDGET_MS = int(os.getenv("CHAT_BUDGET_MS", "8000"))
+CHAT_FALLBACK_RESERVE_MS = int(os.getenv("CHAT_FALLBACK_RESERVE_MS", "50"))
+# Hedging: send a second LLM request once this fraction of the LLM's
+# share has passed without an answer (or as soon as the first one fails)
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0.5"))
+# Each call carries an HTTP timeout of the budget left when it starts,
+# so abandoned calls give their pool thread back by the deadline
+llm_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_CONCURRENCY", "16")), thread_name_prefix="llm")
+
 # --------------------------
 # FASTAPI APP
 # --------------------------
 app = FastAPI()
+profiling.install(app)
 
 # --------------------------
-# EMBEDDING MODEL
+# METRICS
+# Stage histograms for Prometheus, plus a per-request stage
+# log keyed by the X-Request-ID the backend sends along.
+# With several workers (serve.sh), each writes its samples under
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them.
 # --------------------------
-embedder = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-
+REQUEST_ID_HEADER = "X-Request-ID"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+_request_ctx = contextvars.ContextVar("request_ctx", default=None)
+
+REQUEST_LATENCY = Histogram("rag_request_seconds", "End-to-end HTTP request latency", ["method", "route"])
+ENCODE_LATENCY = Histogram("rag_encode_seconds", "SentenceTransformer encode latency")
+VECTOR_QUERY_LATENCY = Histogram("rag_vector_query_seconds", "Chroma query/upsert latency", ["op"])
+LLM_LATENCY = Histogram("rag_llm_seconds", "Gemini generate_content latency")
+CHAT_SERVED = Counter("rag_chat_served_total", "Chat responses by the path that produced them", ["path"])
+
+
+@contextmanager
+def stage(name, histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        ctx = _request_ctx.get()
+        if ctx is not None:
+            ctx["stages"][name] = ctx["stages"].get(name, 0.0) + elapsed
+
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    ctx = {"id": request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex, "stages": {}}
+    _request_ctx.set(ctx)
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(request.method, route.path if route is not None else "unmatched").observe(elapsed)
+    response.headers[REQUEST_ID_HEADER] = ctx["id"]
+    if ctx["stages"]:
+        stages = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in ctx["stages"].items())
+        print(f" [{ctx['id']}] {request.method} {request.url.path} {elapsed * 1000:.1f}ms {stages}")
+    return response
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # --------------------------
-# CHROMA VECTOR STORE
+# EMBEDDING MODEL + VECTOR STORE
+# In-process by default; with RAG_INDEX_SOCKET set, a shared
+# index process owns the model and the Chroma collection.
 # --------------------------
-chroma_client = chromadb.PersistentClient(path="./vector_store")
-collection = chroma_client.get_or_create_collection(
-    name="products",
-    metadata={"hnsw:space": "cosine"}
-)
+index = open_index()
+
+
+def encode(text: str):
+    with stage("encode", ENCODE_LATENCY):
+        return index.encode([text])[0]
+
+
+def split_variants(meta: dict):
+    """Separate the grouped-variant fields the index stores on a representative."""
+    meta = dict(meta)
+    raw = meta.pop("variants", None)
+    meta.pop("variant_count", None)
+    return meta, json.loads(raw) if raw else []
+
+
+def query_index(q_emb, n_results: int, sources: Optional[List[str]] = None):
+    with stage("vector_query", VECTOR_QUERY_LATENCY, op="query"):
+        return index.query(q_emb, n_results, sources)
+
 
 # --------------------------
 # PRODUCT INDEXING ENDPOINT
@@ -46,6 +136,7 @@ class Product(BaseModel):
     category: str
     url: str
     image_url: str
+    source: Optional[str] = None
 
 
 @app.post("/index-product")
@@ -58,49 +149,196 @@ def index_product(product: Product):
         f"URL: {product.url}\n"
     )
 
-    emb = embedder.encode(text).tolist()
-
-    collection.upsert(
-        ids=[str(product.id)],
-        embeddings=[emb],
-        metadatas=[{
-            "title": product.title,
-            "description": product.description,
-            "category": product.category,
-            "features": product.features,
-            "url": product.url,
-            "image": product.image_url,
-        }],
-        documents=[text]
-    )
+    emb = encode(text)
+    metadata = {
+        "title": product.title,
+        "description": product.description,
+        "category": product.category,
+        "features": product.features,
+        "url": product.url,
+        "image": product.image_url,
+        "source": product.source or "",
+    }
+
+    with stage("vector_upsert", VECTOR_QUERY_LATENCY, op="upsert"):
+        stored_as = index.upsert(str(product.id), emb, metadata, text)
+
+    if stored_as != str(product.id):
+        # Folded into a near-duplicate; its neighbors stand for this product too
+        return {"message": "grouped", "product_id": product.id, "variant_of": int(stored_as)}
+
+    with stage("neighbors", VECTOR_QUERY_LATENCY, op="neighbors"):
+        index.refresh_neighbors(str(product.id), emb, metadata)
 
     return {"message": "indexed", "product_id": product.id}
 
+
+# --------------------------
+# SIMILAR PRODUCTS ENDPOINT
+# --------------------------
+@app.get("/similar/{product_id}")
+def similar_products(product_id: int):
+    with stage("neighbors", VECTOR_QUERY_LATENCY, op="similar"):
+        neighbors = index.similar(str(product_id))
+    if neighbors is None:
+        return {"error": "Product not indexed", "results": []}
+
+    results = []
+    for neighbor in neighbors:
+        meta, variants = split_variants(neighbor["metadata"])
+        results.append({**neighbor, "metadata": meta, "variants": variants})
+
+    return {"product_id": product_id, "results": results}
+
+
+# --------------------------
+# PARTITIONS
+# One vector collection per store (see index_backend)
+# Dropping one needs RAG_ADMIN_TOKEN; unset disables it.
+# --------------------------
+RAG_ADMIN_TOKEN = os.getenv("RAG_ADMIN_TOKEN")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+@app.get("/partitions")
+def list_partitions():
+    return {"partitions": index.partition_stats()}
+
+
+@app.delete("/partitions/{source}")
+def drop_partition(source: str, request: Request):
+    """Drop one store's vectors; the backend re-syncs them afterwards."""
+    if RAG_ADMIN_TOKEN is None or request.headers.get(ADMIN_TOKEN_HEADER) != RAG_ADMIN_TOKEN:
+        return JSONResponse({"error": "Admin token required"}, status_code=403)
+    if not index.drop_partition(source):
+        return {"error": "Partition not found", "source": source}
+    search_cache.clear()
+    return {"message": "dropped", "source": source}
+
+# --------------------------
+# SEARCH CANDIDATE CACHE
+# A ranked candidate list is kept per search so that
+# "load more" pages are sliced from memory instead of
+# re-encoding the query and re-querying Chroma.
+# The cache is per process: with RAG_WORKERS > 1 a page
+# that lands on another worker is recomputed.
+# --------------------------
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_PREFETCH_PAGES = int(os.getenv("SEARCH_PREFETCH_PAGES", "4"))
+
+
+class SearchCache:
+    """Bounded LRU of ranked candidate lists with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["created"] > self.ttl:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def put(self, entry: dict) -> str:
+        token = uuid.uuid4().hex
+        entry["created"] = time.monotonic()
+        with self._lock:
+            self._entries[token] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+def encode_cursor(token: str, offset: int) -> str:
+    raw = json.dumps({"t": token, "o": offset}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(data["t"]), int(data["o"])
+    except Exception:
+        return None, 0
+
+
+def fetch_candidates(q_emb, n_results: int, sources: Optional[List[str]] = None):
+    """Query the index for the top n_results, ranked by distance."""
+    results = query_index(q_emb, n_results, sources)
+    candidates = []
+    for meta, score in zip(results["metadatas"], results["distances"]):
+        meta, variants = split_variants(meta)
+        candidates.append({"metadata": meta, "score": float(score), "variants": variants})
+    return candidates
+
+
 # --------------------------
 # SEARCH ENDPOINT
 # --------------------------
 class Query(BaseModel):
     query: str
     top_k: int = 5
+    cursor: Optional[str] = None
+    sources: Optional[List[str]] = None
 
 
 @app.post("/search")
 def search_products(body: Query):
-    q_emb = embedder.encode(body.query).tolist()
-
-    results = collection.query(
-        query_embeddings=[q_emb],
-        n_results=body.top_k
-    )
-
-    output = []
-    for meta, score in zip(results["metadatas"][0], results["distances"][0]):
-        output.append({
-            "metadata": meta,
-            "score": float(score)
-        })
-
-    return {"results": output}
+    entry = None
+    offset = 0
+
+    if body.cursor:
+        token, offset = decode_cursor(body.cursor)
+        entry = search_cache.get(token) if token else None
+        if entry is not None and (entry["query"], entry["sources"]) != (body.query, body.sources):
+            # A cursor only pages through the search that issued it
+            return {"error": "Cursor does not match query", "results": [], "next_cursor": None}
+
+    if entry is None:
+        # First page, or the cached list expired: encode once and
+        # fetch a few pages worth of candidates up front.
+        q_emb = encode(body.query)
+        wanted = offset + body.top_k * SEARCH_PREFETCH_PAGES
+        candidates = fetch_candidates(q_emb, wanted, body.sources)
+        entry = {
+            "query": body.query,
+            "embedding": q_emb,
+            "sources": body.sources,
+            "candidates": candidates,
+            "exhausted": len(candidates) < wanted,
+        }
+        token = search_cache.put(entry)
+
+    end = offset + body.top_k
+    if end > len(entry["candidates"]) and not entry["exhausted"]:
+        # Cache ran out: re-query with the stored embedding (no re-encode)
+        wanted = end + body.top_k * SEARCH_PREFETCH_PAGES
+        entry["candidates"] = fetch_candidates(entry["embedding"], wanted, entry["sources"])
+        entry["exhausted"] = len(entry["candidates"]) < wanted
+
+    output = entry["candidates"][offset:end]
+
+    has_more = end < len(entry["candidates"]) or not entry["exhausted"]
+    next_cursor = encode_cursor(token, end) if has_more and output else None
+
+    return {"results": output, "next_cursor": next_cursor}
 
 # --------------------------
 # CHATBOT ENDPOINT
@@ -108,23 +346,76 @@ def search_products(body: Query):
 class ChatRequest(BaseModel):
     query: str
     top_k: int = 5
+    budget_ms: Optional[int] = None
+    sources: Optional[List[str]] = None
+
+
+def call_llm(prompt: str, timeout: float):
+    return client.models.generate_content(
+        model=MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            http_options=types.HttpOptions(timeout=max(1, int(timeout * 1000)))  # milliseconds
+        )
+    ).text
+
+
+def generate_within(prompt: str, deadline: float):
+    """
+    Ask the LLM for an answer before `deadline` (time.monotonic()).
+    Returns (text, path), or (None, "fallback") if no answer arrived in time.
+    """
+    now = time.monotonic()
+    if deadline <= now:
+        return None, "fallback"
+
+    pending = {llm_pool.submit(call_llm, prompt, deadline - now): "llm"}
+    hedge_at = now + (deadline - now) * LLM_HEDGE_AFTER if LLM_HEDGE else None
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+        done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            path = pending.pop(future)
+            if future.exception() is None:
+                return future.result(), path
+            print(f" [chat] {path} request failed: {future.exception()}")
+            if hedge_at is not None:
+                hedge_at = time.monotonic()
+
+        if hedge_at is not None and time.monotonic() >= hedge_at:
+            pending[llm_pool.submit(call_llm, prompt, deadline - time.monotonic())] = "llm_hedge"
+            hedge_at = None
+
+    return None, "fallback"
+
+
+def templated_answer(top_items):
+    """Retrieval-only answer used when the LLM misses its deadline."""
+    lines = ["Here are the closest matches I found:"]
+    for meta, sim, variants in top_items:
+        lines.append(f"- **{meta['title']}** ({meta['category']}) {meta['url']}")
+    return "\n".join(lines)
 
 
 @app.post("/chat")
 def chat(body: ChatRequest):
+    budget_ms = body.budget_ms or CHAT_BUDGET_MS
+    deadline = time.monotonic() + budget_ms / 1000
 
     # --------------------------
     # Encode Query
     # --------------------------
-    q_emb = embedder.encode(body.query).tolist()
+    q_emb = encode(body.query)
 
-    results = collection.query(
-        query_embeddings=[q_emb],
-        n_results=body.top_k
-    )
+    results = query_index(q_emb, body.top_k, body.sources)
 
-    raw_metas = results["metadatas"][0]
-    raw_distances = results["distances"][0]
+    raw_metas = results["metadatas"]
+    raw_distances = results["distances"]
 
     # --------------------------
     # Filter noisy / irrelevant results
@@ -136,11 +427,16 @@ def chat(body: ChatRequest):
     for meta, dist in zip(raw_metas, raw_distances):
         similarity = 1 - dist
         if similarity >= 0.30:  # threshold to control noise
-            filtered.append((meta, similarity))
+            meta, variants = split_variants(meta)
+            filtered.append((meta, similarity, variants))
 
     # If no meaningful results → fallback response
     if not filtered:
-        return {"response": "I don’t have yoga items in your collection yet. Want me to add some?"}
+        CHAT_SERVED.labels("no_results").inc()
+        return {
+            "response": "I don’t have yoga items in your collection yet. Want me to add some?",
+            "served_by": "no_results"
+        }
 
     # Sort by highest similarity
     filtered.sort(key=lambda x: x[1], reverse=True)
@@ -152,7 +448,7 @@ def chat(body: ChatRequest):
     # Build product context for LLM
     # --------------------------
     blocks = ""
-    for meta, sim in top_items:
+    for meta, sim, variants in top_items:
         blocks += (
             f"Product:\n"
             f"Title: {meta['title']}\n"
@@ -160,8 +456,11 @@ def chat(body: ChatRequest):
             f"Description: {meta['description']}\n"
             f"URL: {meta['url']}\n"
             f"Image: {meta['image']}\n"
-            f"Relevance: {sim:.2f}\n\n"
+            f"Relevance: {sim:.2f}\n"
         )
+        if variants:
+            blocks += "Also available as: " + ", ".join(v["title"] for v in variants) + "\n"
+        blocks += "\n"
 
     # --------------------------
     # LLM Prompt
@@ -184,10 +483,12 @@ RULES:
 Now give the final recommendation.
 """
 
-    # Call Gemini
-    response = client.models.generate_content(
-        model=MODEL,
-        contents=prompt
-    )
+    # Call Gemini within what is left of the budget
+    with stage("llm", LLM_LATENCY):
+        text, served_by = generate_within(prompt, deadline - CHAT_FALLBACK_RESERVE_MS / 1000)
+
+    if text is None:
+        text = templated_answer(top_items)
 
-    return {"response": response.text}
+    CHAT_SERVED.labels(served_by).inc()
+    return {"response": text, "served_by": served_by}
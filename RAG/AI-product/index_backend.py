@@ -0,0 +1,507 @@
+"""
+Embedding model + vector index, usable in-process or shared over IPC.
+
+LocalIndex owns the SentenceTransformer, the Chroma collection and the
+similar-products neighbor table. By default app.py builds one in every
+process. For multi-worker deployments, run this module as the single
+owner process:
+
+    RAG_INDEX_SOCKET=/tmp/rag-index.sock python index_backend.py
+    RAG_INDEX_SOCKET=/tmp/rag-index.sock uvicorn app:app --workers 4
+
+and each API worker gets a RemoteIndex that forwards calls over a Unix
+socket. The server coalesces concurrent encode calls from all workers into
+batched forward passes, so throughput grows with worker count while only
+one copy of the model is held in RAM.
+
+Wire format: 4-byte big-endian length + JSON, one request/response pair
+at a time per connection.
+
+Products are partitioned by store: each `source` gets its own Chroma
+collection ("products-traya", "products-hunnit", ...), so no single HNSW
+graph grows with the whole catalog and a store can be dropped and
+re-synced on its own. Queries fan out over the partitions in parallel and
+merge by distance. Products indexed before partitioning (or without a
+source) stay in the original "products" collection.
+
+Near-duplicate products (colour/size variants listed as separate products)
+are collapsed at index time: a product whose vector is within
+DEDUP_SIMILARITY of an indexed one with the same normalized title is
+stored as a variant of it instead of getting its own vector. The
+representative's metadata carries its variants as a JSON list, which the
+API expands when returning results.
+"""
+import os
+import re
+import json
+import queue
+import socket
+import struct
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_SOCKET = os.getenv("RAG_INDEX_SOCKET")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_store")
+EMBED_MODEL = "sentence-transformers/all-mpnet-base-v2"
+SIMILAR_K = int(os.getenv("SIMILAR_K", "10"))
+
+LEGACY_PARTITION = "products"
+PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", "4"))
+
+DEDUP_VARIANTS = os.getenv("DEDUP_VARIANTS", "true").lower() == "true"
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.95"))
+DEDUP_CANDIDATES = 5
+
+# Title words that name a variant rather than a product
+VARIANT_WORDS = frozenset(
+    "black white blue navy red green grey gray pink purple maroon beige brown "
+    "olive yellow orange peach lavender wine teal charcoal cream "
+    "xs s m l xl xxl xxxl 2xl 3xl 4xl small medium large free size".split()
+)
+
+ENCODE_MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", "64"))
+ENCODE_MAX_WAIT = float(os.getenv("ENCODE_MAX_WAIT_MS", "3")) / 1000
+
+_header = struct.Struct(">I")
+
+
+# --------------------------
+# IN-PROCESS INDEX
+# --------------------------
+class NeighborTable:
+    """Top-k nearest neighbors per product id, kept in memory."""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._neighbors = {}   # product id -> [(neighbor id, similarity)]
+        self._metadata = {}    # product id -> metadata dict
+        self._lock = threading.Lock()
+
+    def _insert(self, pid: str, other: str, similarity: float):
+        current = self._neighbors.get(pid)
+        if current is None:
+            return
+        current = [(n, s) for n, s in current if n != other]
+        current.append((other, similarity))
+        current.sort(key=lambda x: x[1], reverse=True)
+        self._neighbors[pid] = current[:self.k]
+
+    def update(self, pid: str, metadata: dict, results: dict):
+        """Set pid's neighbors from a query result and splice pid into theirs."""
+        found = []
+        with self._lock:
+            self._metadata[pid] = metadata
+            for nid, meta, dist in zip(results["ids"], results["metadatas"], results["distances"]):
+                if nid == pid:
+                    continue
+                similarity = 1 - float(dist)
+                self._metadata.setdefault(nid, meta)
+                found.append((nid, similarity))
+                self._insert(nid, pid, similarity)
+            self._neighbors[pid] = found[:self.k]
+
+    def get(self, pid: str):
+        with self._lock:
+            neighbors = self._neighbors.get(pid)
+            if neighbors is None:
+                return None
+            return [
+                {"id": nid, "metadata": self._metadata.get(nid, {}), "score": sim}
+                for nid, sim in neighbors
+            ]
+
+
+def partition_name(source):
+    """Chroma collection name for a store's products."""
+    slug = re.sub(r"[^a-z0-9]+", "-", (source or "").lower()).strip("-")
+    if not slug:
+        return LEGACY_PARTITION
+    return f"{LEGACY_PARTITION}-{slug}"[:63].rstrip("-")
+
+
+def normalize_title(title):
+    """Title with variant words, bracketed suffixes and punctuation removed."""
+    title = re.sub(r"\(.*?\)|\[.*?\]", " ", (title or "").lower())
+    words = re.findall(r"[a-z0-9]+", title)
+    kept = []
+    for i, w in enumerate(words):
+        if w in VARIANT_WORDS:
+            continue
+        # "Size 32" is a variant; other numbers ("50 ml", "Pack of 2") are different products
+        if w.isdigit() and i and words[i - 1] == "size":
+            continue
+        kept.append(w)
+    return " ".join(kept)
+
+
+def _variant_summary(pid, metadata):
+    return {
+        "id": pid,
+        "title": metadata.get("title", ""),
+        "url": metadata.get("url", ""),
+        "image": metadata.get("image", ""),
+    }
+
+
+def _is_partition(name):
+    return name == LEGACY_PARTITION or name.startswith(LEGACY_PARTITION + "-")
+
+
+class LocalIndex:
+    def __init__(self):
+        # Heavy imports stay here so API workers in shared mode don't pay for them
+        from sentence_transformers import SentenceTransformer
+        import chromadb
+
+        self.embedder = SentenceTransformer(EMBED_MODEL)
+        self.chroma_client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+        self.partitions = {}   # collection name -> collection
+        self._partitions_lock = threading.Lock()
+        for col in self.chroma_client.list_collections():
+            name = getattr(col, "name", col)  # Collection objects before chromadb 0.6, names after
+            if _is_partition(name):
+                self.partitions[name] = self.chroma_client.get_collection(name)
+        self.pool = ThreadPoolExecutor(max_workers=PARTITION_WORKERS, thread_name_prefix="partition")
+        self.neighbors = NeighborTable(SIMILAR_K)
+        self._write_lock = threading.Lock()
+        self._load_groups()
+
+    def _load_groups(self):
+        self.variants = {}   # representative id -> {member id: summary}
+        self.group_of = {}   # member id -> representative id
+        for collection in self._targets(None):
+            reps = collection.get(where={"variant_count": {"$gt": 0}}, include=["metadatas"])
+            for rid, meta in zip(reps["ids"], reps["metadatas"]):
+                members = json.loads(meta.get("variants") or "[]")
+                self.variants[rid] = {m["id"]: m for m in members}
+                for m in members:
+                    self.group_of[m["id"]] = rid
+
+    def _partition(self, source):
+        name = partition_name(source)
+        with self._partitions_lock:
+            collection = self.partitions.get(name)
+            if collection is None:
+                collection = self.chroma_client.get_or_create_collection(
+                    name=name,
+                    metadata={"hnsw:space": "cosine"}
+                )
+                self.partitions[name] = collection
+            return collection
+
+    def _targets(self, sources):
+        with self._partitions_lock:
+            if sources is None:
+                return list(self.partitions.values())
+            names = {partition_name(s) for s in sources}
+            return [c for name, c in self.partitions.items() if name in names]
+
+    def encode(self, texts):
+        return self.embedder.encode(texts).tolist()
+
+    @staticmethod
+    def _query_one(collection, embedding, n_results):
+        results = collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results
+        )
+        return zip(results["ids"][0], results["metadatas"][0], results["distances"][0])
+
+    def query(self, embedding, n_results, sources=None):
+        """Top n_results across the partitions for `sources` (all when None)."""
+        targets = self._targets(sources)
+        if len(targets) == 1:
+            hits = list(self._query_one(targets[0], embedding, n_results))
+        else:
+            hits = []
+            for part in self.pool.map(lambda c: self._query_one(c, embedding, n_results), targets):
+                hits.extend(part)
+            hits.sort(key=lambda hit: hit[2])
+            hits = hits[:n_results]
+        return {
+            "ids": [h[0] for h in hits],
+            "metadatas": [h[1] for h in hits],
+            "distances": [h[2] for h in hits],
+        }
+
+    def _find_duplicate(self, collection, pid, embedding, metadata):
+        """Id of an indexed near-duplicate of this product, if any."""
+        key = normalize_title(metadata.get("title"))
+        if not key or collection.count() == 0:
+            return None
+        for hid, meta, dist in self._query_one(collection, embedding, DEDUP_CANDIDATES):
+            if hid == pid or hid in self.group_of:
+                continue
+            if 1 - dist < DEDUP_SIMILARITY:
+                break
+            if normalize_title(meta.get("title")) == key:
+                return hid
+        return None
+
+    def _write_variants(self, collection, rid):
+        stored = collection.get(ids=[rid], include=["metadatas"])
+        if not stored["ids"]:
+            return
+        members = list(self.variants.get(rid, {}).values())
+        meta = dict(stored["metadatas"][0])
+        meta["variants"] = json.dumps(members)
+        meta["variant_count"] = len(members)
+        collection.update(ids=[rid], metadatas=[meta])
+
+    def _ungroup(self, collection, pid):
+        rid = self.group_of.pop(pid, None)
+        if rid is not None:
+            self.variants.get(rid, {}).pop(pid, None)
+            self._write_variants(collection, rid)
+
+    def upsert(self, pid, embedding, metadata, document):
+        """
+        Index a product, or fold it into an indexed near-duplicate.
+        Returns the id the product is stored under.
+        """
+        collection = self._partition(metadata.get("source"))
+        with self._write_lock:
+            rid = None
+            if DEDUP_VARIANTS and not self.variants.get(pid):
+                rid = self._find_duplicate(collection, pid, embedding, metadata)
+
+            if rid is not None:
+                if self.group_of.get(pid) != rid:
+                    self._ungroup(collection, pid)
+                self.group_of[pid] = rid
+                self.variants.setdefault(rid, {})[pid] = _variant_summary(pid, metadata)
+                self._write_variants(collection, rid)
+                # Drop the product's own vector if it had one before being grouped
+                collection.delete(ids=[pid])
+                stored_as = rid
+            else:
+                self._ungroup(collection, pid)
+                members = list(self.variants.get(pid, {}).values())
+                if members:
+                    metadata = {**metadata, "variants": json.dumps(members), "variant_count": len(members)}
+                collection.upsert(
+                    ids=[pid],
+                    embeddings=[embedding],
+                    metadatas=[metadata],
+                    documents=[document]
+                )
+                stored_as = pid
+
+            legacy = self.partitions.get(LEGACY_PARTITION)
+            if legacy is not None and legacy is not collection:
+                # Re-synced with a source: drop the pre-partitioning copy
+                legacy.delete(ids=[pid])
+        return stored_as
+
+    def refresh_neighbors(self, pid, embedding, metadata):
+        self.neighbors.update(pid, metadata, self.query(embedding, self.neighbors.k + 1))
+
+    def similar(self, pid):
+        """Neighbor list for pid, or None if pid is not indexed."""
+        pid = self.group_of.get(pid, pid)
+        found = self.neighbors.get(pid)
+        if found is not None:
+            return found
+        # Not seen since this process started (e.g. after a restart):
+        # use the stored vector rather than re-encoding.
+        for collection in self._targets(None):
+            stored = collection.get(ids=[pid], include=["embeddings", "metadatas"])
+            if stored["ids"]:
+                embedding = [float(x) for x in stored["embeddings"][0]]
+                self.refresh_neighbors(pid, embedding, stored["metadatas"][0])
+                return self.neighbors.get(pid) or []
+        return None
+
+    def partition_stats(self):
+        return {name: collection.count() for name, collection in sorted(self.partitions.items())}
+
+    def drop_partition(self, source):
+        """Delete one store's collection so it can be rebuilt from a re-sync."""
+        name = partition_name(source)
+        with self._partitions_lock:
+            if self.partitions.pop(name, None) is None:
+                return False
+            self.chroma_client.delete_collection(name)
+        # Neighbor lists and variant groups may point into the dropped partition
+        self.neighbors = NeighborTable(SIMILAR_K)
+        with self._write_lock:
+            self._load_groups()
+        return True
+
+
+# --------------------------
+# IPC CLIENT
+# --------------------------
+def _send(sock, payload):
+    body = json.dumps(payload).encode()
+    sock.sendall(_header.pack(len(body)) + body)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("index server closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class RemoteIndex:
+    """Same interface as LocalIndex, forwarded to the index server."""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def _call(self, op, *args):
+        try:
+            sock = self._idle.get_nowait()
+        except queue.Empty:
+            sock = self._connect()
+        try:
+            _send(sock, {"op": op, "args": args})
+            (size,) = _header.unpack(_recv_exact(sock, _header.size))
+            reply = json.loads(_recv_exact(sock, size))
+        except Exception:
+            sock.close()
+            raise
+        self._idle.put(sock)
+        if not reply["ok"]:
+            raise RuntimeError(f"index server: {reply['error']}")
+        return reply["result"]
+
+    def encode(self, texts):
+        return self._call("encode", texts)
+
+    def query(self, embedding, n_results, sources=None):
+        return self._call("query", embedding, n_results, sources)
+
+    def upsert(self, pid, embedding, metadata, document):
+        return self._call("upsert", pid, embedding, metadata, document)
+
+    def refresh_neighbors(self, pid, embedding, metadata):
+        return self._call("refresh_neighbors", pid, embedding, metadata)
+
+    def similar(self, pid):
+        return self._call("similar", pid)
+
+    def partition_stats(self):
+        return self._call("partition_stats")
+
+    def drop_partition(self, source):
+        return self._call("drop_partition", source)
+
+
+def open_index():
+    """RemoteIndex when RAG_INDEX_SOCKET is set, otherwise an in-process LocalIndex."""
+    if INDEX_SOCKET:
+        return RemoteIndex(INDEX_SOCKET)
+    return LocalIndex()
+
+
+# --------------------------
+# IPC SERVER
+# --------------------------
+class EncodeBatcher:
+    """Coalesces concurrent encode requests into one forward pass."""
+
+    def __init__(self, index, max_batch=ENCODE_MAX_BATCH, max_wait=ENCODE_MAX_WAIT):
+        self.index = index
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = asyncio.Queue()
+
+    async def encode(self, texts):
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((texts, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.pending.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [t for item, _ in batch for t in item]
+            try:
+                embeddings = await loop.run_in_executor(None, self.index.encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for item, future in batch:
+                future.set_result(embeddings[offset:offset + len(item)])
+                offset += len(item)
+
+
+async def serve(index, path):
+    batcher = EncodeBatcher(index)
+    ops = {
+        "query": index.query,
+        "upsert": index.upsert,
+        "refresh_neighbors": index.refresh_neighbors,
+        "similar": index.similar,
+        "partition_stats": index.partition_stats,
+        "drop_partition": index.drop_partition,
+    }
+    loop = asyncio.get_running_loop()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                (size,) = _header.unpack(await reader.readexactly(_header.size))
+                request = json.loads(await reader.readexactly(size))
+                try:
+                    if request["op"] == "encode":
+                        result = await batcher.encode(*request["args"])
+                    else:
+                        result = await loop.run_in_executor(None, ops[request["op"]], *request["args"])
+                    reply = {"ok": True, "result": result}
+                except Exception as e:
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                body = json.dumps(reply).encode()
+                writer.write(_header.pack(len(body)) + body)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path=path)
+    os.chmod(path, 0o600)
+    asyncio.create_task(batcher.run())
+    print(f" [Index] Serving embedding model and vector index on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    path = INDEX_SOCKET or "/tmp/rag-index.sock"
+    asyncio.run(serve(LocalIndex(), path))
+
+
+if __name__ == "__main__":
+    main()
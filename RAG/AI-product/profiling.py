@@ -0,0 +1,225 @@
+"""
+On-demand cProfile capture for single requests: opt in with
+PROFILE_ENABLED=true and PROFILE_TOKEN, then send X-Profile: <token> (or set
+PROFILE_SAMPLE_PERCENT) and read results from /admin/profiles. Kept in step with the backend's
+backend/profiling.py, which documents the details.
+"""
+import io
+import os
+import time
+import uuid
+import random
+import marshal
+import pstats
+import cProfile
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_LOG_LIMIT = int(os.getenv("PROFILE_LOG_LIMIT", "20"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ADMIN_PREFIX = "/admin/profiles"
+
+# Profile being captured for the current request, if any
+_current = contextvars.ContextVar("profile", default=None)
+_busy = threading.Lock()
+
+
+class ProfileRecord:
+    __slots__ = ("id", "method", "path", "started", "duration_ms", "profilers", "stats")
+
+    def __init__(self, method, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.duration_ms = None
+        self.profilers = []
+        self.stats = None
+
+    def finish(self, elapsed):
+        self.duration_ms = elapsed * 1000
+        stats = pstats.Stats(self.profilers[0], stream=io.StringIO())
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+        self.stats = stats
+        self.profilers = []
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started": self.started,
+            "duration_ms": self.duration_ms,
+        }
+
+    def render(self, sort, limit):
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class ProfileStore:
+    """The most recent profiles, oldest evicted first."""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records[record.id] = record
+            while len(self._records) > self.keep:
+                self._records.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._records.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [r.summary() for r in reversed(self._records.values())]
+
+
+profile_store = ProfileStore(PROFILE_KEEP)
+
+
+def _authorized(value):
+    return PROFILE_TOKEN is not None and value == PROFILE_TOKEN
+
+
+def _wanted(request):
+    if request.url.path.startswith(ADMIN_PREFIX):
+        return False
+    if _authorized(request.headers.get(PROFILE_HEADER)):
+        return True
+    return PROFILE_SAMPLE_PERCENT > 0 and random.random() * 100 < PROFILE_SAMPLE_PERCENT
+
+
+async def profile_requests(request: Request, call_next):
+    if not _wanted(request) or not _busy.acquire(blocking=False):
+        return await call_next(request)
+
+    record = ProfileRecord(request.method, request.url.path)
+    profiler = cProfile.Profile()
+    record.profilers.append(profiler)
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.disable()
+        record.finish(time.perf_counter() - start)
+        profile_store.add(record)
+    finally:
+        _current.reset(token)
+        _busy.release()
+
+    response.headers[PROFILE_ID_HEADER] = record.id
+    if PROFILE_TOKEN is None:
+        # No admin routes to fetch it from, so log the top entries
+        print(f" [Profile] {record.method} {record.path} {record.duration_ms:.1f}ms ({record.id})")
+        print(record.render("cumulative", PROFILE_LOG_LIMIT))
+    else:
+        print(f" [Profile] {record.method} {record.path} {record.duration_ms:.1f}ms -> {ADMIN_PREFIX}/{record.id}")
+    return response
+
+
+def _profiled(endpoint):
+    """Run a sync endpoint under its own profiler when the request is being profiled."""
+    if asyncio.iscoroutinefunction(endpoint):
+        return endpoint  # runs on the loop thread, already covered by the middleware
+
+    @functools.wraps(endpoint)
+    def run(*args, **kwargs):
+        record = _current.get()
+        if record is None:
+            return endpoint(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows a single active profiler per process
+            return endpoint(*args, **kwargs)
+        record.profilers.append(profiler)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+    return run
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+def _admin_denied(request):
+    if not _authorized(request.headers.get(PROFILE_HEADER)):
+        return JSONResponse({"error": "Profile token required"}, status_code=403)
+    return None
+
+
+def list_profiles(request: Request):
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    return {"profiles": profile_store.list()}
+
+
+def get_profile(profile_id: str, request: Request, sort: str = "cumulative", limit: int = 40, format: str = "text"):
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    record = profile_store.get(profile_id)
+    if record is None:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    if format == "pstats":
+        # Loadable with pstats.Stats(path) or snakeviz
+        return Response(
+            content=marshal.dumps(record.stats.stats),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{record.id}.prof"'}
+        )
+    try:
+        return Response(content=record.render(sort, limit), media_type="text/plain")
+    except KeyError:
+        return JSONResponse({"error": f"Unknown sort key: {sort}"}, status_code=400)
+
+
+def install(app):
+    """
+    Enable profiling hooks on app when PROFILE_ENABLED is set. Call right
+    after creating the app so every route gets the sync-endpoint hook.
+    On-demand profiling and the admin routes need PROFILE_TOKEN.
+    """
+    if not PROFILE_ENABLED:
+        return
+    if PROFILE_TOKEN is None and PROFILE_SAMPLE_PERCENT <= 0:
+        print(" [Profile] PROFILE_ENABLED without PROFILE_TOKEN or PROFILE_SAMPLE_PERCENT, not enabling")
+        return
+    app.router.route_class = ProfiledRoute
+    app.middleware("http")(profile_requests)
+    if PROFILE_TOKEN is None:
+        print(f" [Profile] Enabled for sampling only ({PROFILE_SAMPLE_PERCENT}%); set PROFILE_TOKEN for {PROFILE_HEADER} and {ADMIN_PREFIX}")
+        return
+    app.add_api_route(ADMIN_PREFIX, list_profiles, methods=["GET"])
+    app.add_api_route(ADMIN_PREFIX + "/{profile_id}", get_profile, methods=["GET"])
+    print(f" [Profile] Enabled (header {PROFILE_HEADER}, sample {PROFILE_SAMPLE_PERCENT}%)")
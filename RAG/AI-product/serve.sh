@@ -0,0 +1,35 @@
+#!/bin/sh
+# Single worker: the API process loads the model and vector store itself.
+# RAG_WORKERS > 1: one index process owns the model and the Chroma store,
+# and the API workers reach it over a Unix socket (see index_backend.py).
+# The /search cursor cache stays per worker, so a "load more" page served by
+# another worker re-encodes the query instead of hitting the cache.
+# Metrics are written to PROMETHEUS_MULTIPROC_DIR so /metrics on any worker
+# reports all of them.
+set -e
+
+WORKERS="${RAG_WORKERS:-1}"
+PORT="${PORT:-7860}"
+
+if [ "$WORKERS" -gt 1 ]; then
+    export RAG_INDEX_SOCKET="${RAG_INDEX_SOCKET:-/tmp/rag-index.sock}"
+    rm -f "$RAG_INDEX_SOCKET"
+
+    # Start from an empty directory so counters don't carry over restarts
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/rag-metrics}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    python index_backend.py &
+    INDEX_PID=$!
+
+    # Model load can take a while; wait for the socket before taking traffic
+    while [ ! -S "$RAG_INDEX_SOCKET" ]; do
+        if ! kill -0 "$INDEX_PID" 2>/dev/null; then
+            echo "index_backend.py exited before opening $RAG_INDEX_SOCKET" >&2
+            exit 1
+        fi
+        sleep 1
+    done
+fi
+
+exec uvicorn app:app --host 0.0.0.0 --port "$PORT" --workers "$WORKERS"
@@ -1,6 +1,9 @@
 # database.py
 import os
+import uuid
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Use environment variable with fallback to local development
@@ -14,13 +17,71 @@ if DATABASE_URL.startswith("postgres://"):
 
 print(f"Connecting to database at: {DATABASE_URL.split('@')[-1] if '@' in DATABASE_URL else 'SQLite/Local'}")
 
-engine = create_engine(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Pool tuning (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Prepared statement cache per asyncpg connection. 0 turns off both asyncpg's and
+# SQLAlchemy's caches and uses unique statement names, as pgbouncer in
+# transaction mode requires.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+pool_args = {} if IS_SQLITE else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+
+# SQLite (local runs/benchmarks) is used from scraper worker threads too
+connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_pre_ping=DB_POOL_PRE_PING, **pool_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+def make_async_url(url):
+    """Same database through an asyncio driver: asyncpg for Postgres, aiosqlite for SQLite."""
+    url = make_url(url)
+    async_connect_args = {}
+    if url.drivername in ("postgresql", "postgresql+psycopg2"):
+        query = dict(url.query)
+        # asyncpg takes ssl=<mode> instead of libpq's sslmode
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            async_connect_args["ssl"] = sslmode
+        query["prepared_statement_cache_size"] = str(DB_STATEMENT_CACHE_SIZE)
+        if DB_STATEMENT_CACHE_SIZE == 0:
+            async_connect_args["statement_cache_size"] = 0
+            async_connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.drivername in ("sqlite", "sqlite+pysqlite"):
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, async_connect_args
+
+
+ASYNC_DATABASE_URL, async_connect_args = make_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=async_connect_args,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    **pool_args
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
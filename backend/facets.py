@@ -0,0 +1,227 @@
+"""
+Browse facets: product counts and price ranges per (category, source).
+
+The aggregates live in the product_facets table so a browse page reads a
+handful of rows instead of scanning products. refresh_facets() is run at the
+end of every scrape (run_all_scrapers, whether from the backend or the
+scraper service) and only recomputes groups that changed: groups of products
+updated since the previous refresh, plus groups that products left (moved to
+another category/source or deleted), which session events record at commit.
+Bulk UPDATE/DELETE statements don't say which rows they hit, so after one
+the next refresh rebuilds every group.
+"""
+import threading
+from datetime import datetime
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from models import Product, ProductFacet, parse_price
+from database import SessionLocal
+
+# Groups vacated by committed changes since the last refresh
+_vacated = set()
+_vacated_lock = threading.Lock()
+# Set when a bulk statement committed; the next refresh rebuilds everything
+_rebuild = False
+
+
+def _key(category, source):
+    return (category or "", source or "")
+
+
+def _matches(column, value):
+    # "" stands for both NULL and empty in the facet key
+    return or_(column == "", column.is_(None)) if value == "" else column == value
+
+
+def _merge(a, b):
+    """Combine two aggregate tuples (NULL and "" rows share a facet key)"""
+    if a is None:
+        return b
+    lows = [x for x in (a[2], b[2]) if x is not None]
+    highs = [x for x in (a[3], b[3]) if x is not None]
+    return (
+        a[0] + b[0],
+        a[1] + b[1],
+        min(lows) if lows else None,
+        max(highs) if highs else None,
+        a[4] + b[4],
+    )
+
+
+def refresh_facets(db):
+    """
+    Recompute the facet rows for changed groups; the first run builds all of them.
+    Returns the number of groups refreshed.
+    """
+    global _rebuild
+    started = datetime.utcnow()
+    last = db.query(func.max(ProductFacet.refreshed_at)).scalar()
+
+    with _vacated_lock:
+        groups = set(_vacated)
+        _vacated.clear()
+        rebuild, _rebuild = _rebuild, False
+    if rebuild:
+        # Every group that has products now, or had them at the last refresh
+        last = None
+        groups |= {_key(c, s) for c, s in db.query(ProductFacet.category, ProductFacet.source).all()}
+
+    touched = db.query(Product.category, Product.source).distinct()
+    if last is not None:
+        touched = touched.filter(Product.updated_at >= last)
+    groups |= {_key(c, s) for c, s in touched.all()}
+    if not groups:
+        return 0
+
+    categories = {c for c, _ in groups}
+    rows = (
+        db.query(
+            Product.category,
+            Product.source,
+            func.count(Product.id),
+            func.count(Product.price_value),
+            func.min(Product.price_value),
+            func.max(Product.price_value),
+            func.coalesce(func.sum(Product.price_value), 0),
+        )
+        .filter(or_(*(_matches(Product.category, c) for c in categories)))
+        .group_by(Product.category, Product.source)
+        .all()
+    )
+
+    aggregates = {}
+    for category, source, count, priced, low, high, total in rows:
+        key = _key(category, source)
+        if key in groups:
+            aggregates[key] = _merge(aggregates.get(key), (count, priced, low, high, total))
+
+    for category, source in groups:
+        facet = db.get(ProductFacet, (category, source))
+        found = aggregates.get((category, source))
+        if found is None:
+            if facet is not None:
+                db.delete(facet)
+            continue
+        if facet is None:
+            facet = ProductFacet(category=category, source=source)
+            db.add(facet)
+        facet.product_count, facet.priced_count, facet.min_price, facet.max_price, facet.price_sum = found
+        facet.refreshed_at = started
+
+    db.commit()
+    print(f" [Facets] Refreshed {len(groups)} group(s)")
+    return len(groups)
+
+
+def refresh_facet_table():
+    """refresh_facets() on its own session, logging rather than raising failures"""
+    db = SessionLocal()
+    try:
+        return refresh_facets(db)
+    except Exception as e:
+        db.rollback()
+        print(f" [Facets] Refresh failed: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def backfill_price_values(db, batch_size=500):
+    """Fill price_value for rows saved before the column existed"""
+    filled = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Product)
+            .filter(Product.price_value.is_(None), Product.price.isnot(None), Product.id > last_id)
+            .order_by(Product.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        for product in rows:
+            product.price_value = parse_price(product.price)
+            filled += product.price_value is not None
+        last_id = rows[-1].id
+        db.commit()
+    if filled:
+        print(f" [Facets] Backfilled price_value for {filled} products")
+    return filled
+
+
+def facet_summary(rows):
+    """Response body for /facets from ProductFacet rows"""
+    facets = []
+    categories = {}
+    sources = {}
+    low = high = None
+    for row in rows:
+        facets.append({
+            "category": row.category,
+            "source": row.source,
+            "count": row.product_count,
+            "min_price": row.min_price,
+            "max_price": row.max_price,
+            "avg_price": row.price_sum / row.priced_count if row.priced_count else None,
+        })
+        categories[row.category] = categories.get(row.category, 0) + row.product_count
+        sources[row.source] = sources.get(row.source, 0) + row.product_count
+        if row.min_price is not None:
+            low = row.min_price if low is None else min(low, row.min_price)
+        if row.max_price is not None:
+            high = row.max_price if high is None else max(high, row.max_price)
+    return {
+        "facets": facets,
+        "categories": categories,
+        "sources": sources,
+        "price": {"min": low, "max": high},
+        "total": sum(categories.values()),
+    }
+
+
+# --------------------------
+# Groups vacated by moves and deletes
+# --------------------------
+@event.listens_for(Session, "before_flush")
+def _collect_vacated(session, flush_context, instances):
+    vacated = session.info.setdefault("facet_vacated", set())
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        old_category = get_history(obj, "category").deleted
+        old_source = get_history(obj, "source").deleted
+        if old_category or old_source:
+            vacated.add(_key(
+                old_category[0] if old_category else obj.category,
+                old_source[0] if old_source else obj.source,
+            ))
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            vacated.add(_key(obj.category, obj.source))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Product:
+            orm_execute_state.session.info["facet_bulk_change"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_vacated(session):
+    global _rebuild
+    vacated = session.info.pop("facet_vacated", None)
+    bulk = session.info.pop("facet_bulk_change", False)
+    if vacated or bulk:
+        with _vacated_lock:
+            _vacated.update(vacated or ())
+            _rebuild = _rebuild or bulk
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_vacated(session):
+    session.info.pop("facet_vacated", None)
+    session.info.pop("facet_bulk_change", None)
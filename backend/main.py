@@ -2,11 +2,10 @@
 import os
 import time
 from datetime import datetime
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, text
-from database import Base, engine, get_db, SessionLocal
+from fastapi import FastAPI, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, text, select, update
+from database import Base, engine, SessionLocal, async_engine, get_async_db, AsyncSessionLocal
 import models
 import schemas
 import httpx
@@ -14,20 +13,33 @@ from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import BackgroundTasks
 from scrape import run_all_scrapers
+from suggest import suggest_index
+from facets import refresh_facet_table, backfill_price_values, facet_summary
+import metrics
+from metrics import stage, UPSTREAM_LATENCY, SYNC_ITEMS, SYNC_ITEMS_PER_SECOND
+from product_cache import product_cache, serialize_product, respond
+from typing import List, Optional
 import asyncio
 
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pathlib import Path
+from fastapi.responses import JSONResponse
+from static_assets import StaticManifest
+import profiling
 
 app = FastAPI(title="AI Shopping Assistant API")
+profiling.install(app)
 
 
-static_dir = Path("static")
-if (static_dir / "static").exists():
-    app.mount("/static", StaticFiles(directory="static/static"), name="static")
-elif static_dir.exists():
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+# React build: scanned once into an in-memory manifest
+static_manifest = StaticManifest("static")
+
+
+@app.get("/static/{asset_path:path}")
+async def serve_static(asset_path: str, request: Request):
+    # CRA puts bundles under build/static/, which lands at static/static/
+    asset = static_manifest.lookup(f"static/{asset_path}") or static_manifest.lookup(asset_path)
+    if asset is None:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    return static_manifest.respond(request, asset)
 
 
 
@@ -40,32 +52,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """Assign/propagate a request id and log per-stage timings"""
+    ctx = metrics.new_request(request.headers.get(metrics.REQUEST_ID_HEADER))
+    request.state.request_id = ctx["id"]
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    metrics.REQUEST_LATENCY.labels(request.method, route_path).observe(elapsed)
+    response.headers[metrics.REQUEST_ID_HEADER] = ctx["id"]
+    if ctx["stages"]:
+        print(f" [{ctx['id']}] {request.method} {request.url.path} {elapsed * 1000:.1f}ms {metrics.format_stages(ctx)}")
+    return response
+
 class ChatQuery(BaseModel):
     query: str
     top_k: int = 5
+    budget_ms: Optional[int] = None
+    sources: Optional[List[str]] = None
 
 
 Base.metadata.create_all(bind=engine)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
 
 
 try:
     with engine.connect() as conn:
         conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS synced_at TIMESTAMP"))
+        conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS price_value DOUBLE PRECISION"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_price_value ON products (price_value)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_category_source ON products (category, source)"))
         conn.commit()
 except Exception as e:
     print(f"Migration warning: {e}")
 
+try:
+    with SessionLocal() as db:
+        backfill_price_values(db)
+except Exception as e:
+    print(f"Price backfill warning: {e}")
+
 # HuggingFace Space URLs from environment
 HF_RAG_URL = os.getenv("HF_RAG_URL", "https://VivanRajath-AI-product.hf.space/index-product")
 HF_SEARCH_URL = os.getenv("HF_SEARCH_URL", "https://VivanRajath-AI-product.hf.space/search")
 HF_CHAT_URL = os.getenv("HF_CHAT_URL", "https://VivanRajath-AI-product.hf.space/chat")
+HF_SIMILAR_URL = os.getenv("HF_SIMILAR_URL", "https://VivanRajath-AI-product.hf.space/similar")
+HF_PARTITIONS_URL = os.getenv("HF_PARTITIONS_URL", "https://VivanRajath-AI-product.hf.space/partitions")
+# Sent as X-Admin-Token on partition drops; must match the RAG service's
+RAG_ADMIN_TOKEN = os.getenv("RAG_ADMIN_TOKEN")
+
+# Answer budget forwarded to the RAG /chat; the HTTP timeout allows some
+# network slack on top before we give up and answer from search alone
+CHAT_BUDGET_MS = int(os.getenv("CHAT_BUDGET_MS", "8000"))
+CHAT_NETWORK_SLACK = float(os.getenv("CHAT_NETWORK_SLACK", "2"))
 
 
 @app.get("/")
-async def serve_spa():
+async def serve_spa(request: Request):
     """Serve the React App"""
-    if static_dir.exists():
-        return FileResponse("static/index.html")
+    if static_manifest.enabled:
+        return static_manifest.respond_index(request)
     return {"message": "AI Shopping Assistant API is running (Frontend not built)"}
 
 
@@ -75,12 +126,14 @@ async def serve_spa():
 async def custom_404_handler(request, exc):
     path = request.url.path
 
-    if "." in path.split("/")[-1] and static_dir.exists():
-        return {"detail": "Not Found"}
-        
-    if static_dir.exists():
-        return FileResponse("static/index.html")
-    return {"detail": "Not Found"}
+    if "." in path.split("/")[-1] or not static_manifest.enabled:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    return static_manifest.respond_index(request)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/api/health")
 def health_check():
@@ -92,43 +145,120 @@ def health_check():
     }
 
 @app.post("/add-product")
-def add_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
+async def add_product(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if product already exists to avoid duplicates (optional but good)
-    existing = db.query(models.Product).filter(models.Product.url == product.url).first()
+    existing = await db.scalar(select(models.Product).where(models.Product.url == product.url).limit(1))
     if existing:
         return {"message": "Product already exists", "id": existing.id}
     
     new_product = models.Product(**product.model_dump())
     db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    await db.commit()
     return {"message": "Product added", "id": new_product.id}
 
 @app.get("/products")
-def get_products(db: Session = Depends(get_db)):
-    return db.query(models.Product).all()
+async def get_products(request: Request, offset: int = 0, limit: Optional[int] = None):
+    """All products, or an id-ordered page when offset/limit are given (cached)"""
+    key = ("list", offset, limit)
+    entry = product_cache.get(key)
+    if entry is None:
+        generation = product_cache.generation
+        query = select(models.Product)
+        paged = limit is not None or offset > 0
+        if paged:
+            query = query.order_by(models.Product.id).offset(offset).limit(limit)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.scalars(query)).all()
+        tail = not paged or limit is None or len(rows) < limit
+        entry = product_cache.put(key, [serialize_product(p) for p in rows], [p.id for p in rows], tail, generation)
+    return respond(request, entry)
 
 @app.get("/products/{product_id}")
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        return {"error": "Product not found"}
-    return product
+async def get_product(product_id: int, request: Request):
+    key = ("product", product_id)
+    entry = product_cache.get(key)
+    if entry is None:
+        generation = product_cache.generation
+        async with AsyncSessionLocal() as db:
+            product = await db.get(models.Product, product_id)
+        if not product:
+            return {"error": "Product not found"}
+        entry = product_cache.put(key, serialize_product(product), [product.id], False, generation)
+    return respond(request, entry)
+
+@app.get("/products/{product_id}/similar")
+def get_similar_products(product_id: int, request: Request):
+    """Related products from the RAG neighbor table (no query encoding or LLM call)."""
+    try:
+        with httpx.Client(timeout=10, headers=metrics.upstream_headers(request)) as client:
+            with stage(UPSTREAM_LATENCY, "hf_similar", target="similar"):
+                response = client.get(f"{HF_SIMILAR_URL}/{product_id}")
+            data = response.json()
+    except Exception as e:
+        return {"results": [], "error": str(e)}
+
+    similar = []
+    for result in data.get("results", []):
+        meta = result.get("metadata", {})
+        similar.append({
+            "id": int(result.get("id")),
+            "title": meta.get("title", ""),
+            "category": meta.get("category", ""),
+            "url": meta.get("url", ""),
+            "image_url": meta.get("image", ""),
+            "score": result.get("score", 0)
+        })
+    return {"results": similar}
+
+@app.get("/suggest")
+async def suggest(q: str = "", limit: int = 8):
+    """Typeahead completions from catalog titles, categories and tags (in-memory)"""
+    return {"query": q, "suggestions": suggest_index.suggest(q, limit=min(limit, 20))}
+
+def refresh_suggest_index():
+    db = SessionLocal()
+    try:
+        suggest_index.refresh(db)
+    except Exception as e:
+        print(f" [Suggest] Index refresh failed: {e}")
+    finally:
+        db.close()
+
+@app.post("/suggest/refresh")
+async def refresh_suggest():
+    """Pick up catalog changes made by another process (the scheduled scraper calls this)"""
+    await asyncio.to_thread(refresh_suggest_index)
+    return {"message": "Suggest index refreshed"}
+
+@app.get("/facets")
+async def get_facets(category: Optional[str] = None, source: Optional[str] = None):
+    """Counts and price ranges per category/source from the precomputed facet table"""
+    query = select(models.ProductFacet).order_by(models.ProductFacet.category, models.ProductFacet.source)
+    if category is not None:
+        query = query.where(models.ProductFacet.category == category)
+    if source is not None:
+        query = query.where(models.ProductFacet.source == source)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.scalars(query)).all()
+    return facet_summary(rows)
 
 @app.post("/sync-to-rag")
-def sync_to_rag(db: Session = Depends(get_db)):
+async def sync_to_rag(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Sync unsynced products to RAG.
     Rate limited to avoid 503 errors from HF/GenAI.
     """
     # Only get products that haven't been synced yet
     # Limit to 20 at a time to prevent timeout
-    products = db.query(models.Product).filter(models.Product.synced_at == None).limit(20).all()
+    products = (await db.scalars(
+        select(models.Product).where(models.Product.synced_at == None).limit(20)
+    )).all()
     
     if not products:
         return {"message": "No new products to sync"}
 
     success_count = 0
+    started = time.perf_counter()
     
     for p in products:
         payload = {
@@ -138,58 +268,88 @@ def sync_to_rag(db: Session = Depends(get_db)):
             "features": p.features,
             "category": p.category,
             "url": p.url,
-            "image_url": p.images.split(",")[0] if p.images else ""
+            "image_url": p.images.split(",")[0] if p.images else "",
+            "source": p.source
         }
 
         try:
-            with httpx.Client(timeout=30) as client:
-                response = client.post(HF_RAG_URL, json=payload)
+            async with httpx.AsyncClient(timeout=30, headers=metrics.upstream_headers(request)) as client:
+                with stage(UPSTREAM_LATENCY, "hf_index", target="index-product"):
+                    response = await client.post(HF_RAG_URL, json=payload)
                 if response.status_code == 200:
                     p.synced_at = datetime.utcnow()
-                    db.commit()
+                    await db.commit()
                     success_count += 1
+                    SYNC_ITEMS.labels("ok").inc()
                 else:
+                    SYNC_ITEMS.labels("failed").inc()
                     print(f" Failed to sync product {p.id}: {response.status_code}")
                     
             # Rate limiting: Sleep 2 seconds between requests
             # This prevents "503 UNAVAILABLE" from Google GenAI
-            time.sleep(2)
+            await asyncio.sleep(2)
             
         except Exception as e:
+            SYNC_ITEMS.labels("error").inc()
             print(f" Error sending product {p.id} to HF:", e)
 
+    SYNC_ITEMS_PER_SECOND.set(success_count / (time.perf_counter() - started))
     return {"message": f"Synced {success_count} products to HuggingFace RAG"}
 
+async def post_within(client, url, payload, name, target, timeout):
+    """POST to the RAG service, giving up after `timeout` seconds in total"""
+    with stage(UPSTREAM_LATENCY, name, target=target):
+        response = await asyncio.wait_for(client.post(url, json=payload), timeout)
+    return response.json()
+
 @app.post("/chat")
-def chat_endpoint(body: ChatQuery):
+async def chat_endpoint(body: ChatQuery, request: Request):
     """
     Semantic search chatbot using HF Space.
     All search is done via HF vector database, not local DB.
     """
     
+    budget_ms = body.budget_ms or CHAT_BUDGET_MS
+    timeout = budget_ms / 1000 + CHAT_NETWORK_SLACK
+    timed_out = (asyncio.TimeoutError, httpx.TimeoutException)
+
     try:
-        with httpx.Client(timeout=30) as client:
+        async with httpx.AsyncClient(timeout=timeout, headers=metrics.upstream_headers(request)) as client:
             
-            # Step 1: Get LLM response from HF /chat
-            # (HF /chat internally calls /search and formats response)
+            # Step 1: LLM response from HF /chat and, alongside it, search
+            # results for product recommendations. Both share the budget.
             chat_payload = {
                 "query": body.query,
-                "top_k": body.top_k
+                "top_k": body.top_k,
+                "budget_ms": budget_ms,
+                "sources": body.sources
             }
-            
-            chat_response = client.post(HF_CHAT_URL, json=chat_payload)
-            chat_data = chat_response.json()
-            
-            # Step 2: Also get search results for product recommendations
             search_payload = {
                 "query": body.query,
-                "top_k": body.top_k
+                "top_k": body.top_k,
+                "sources": body.sources
             }
             
-            search_response = client.post(HF_SEARCH_URL, json=search_payload)
-            search_data = search_response.json()
+            chat_data, search_data = await asyncio.gather(
+                post_within(client, HF_CHAT_URL, chat_payload, "hf_chat", "chat", timeout),
+                post_within(client, HF_SEARCH_URL, search_payload, "hf_search", "search", timeout),
+                return_exceptions=True
+            )
+
+            if isinstance(chat_data, timed_out):
+                # Past the budget: fall back to recommendations only
+                print(f" Chat answer timed out after {budget_ms}ms, serving search results only")
+                chat_data = {"served_by": "fallback"}
+            elif isinstance(chat_data, Exception):
+                raise chat_data
+
+            if isinstance(search_data, timed_out):
+                print(f" Search timed out after {budget_ms}ms, answering without recommendations")
+                search_data = {}
+            elif isinstance(search_data, Exception):
+                raise search_data
             
-            # Step 3: Format recommendations from search results
+            # Step 2: Format recommendations from search results
             recommendations = []
             for result in search_data.get("results", []):
                 meta = result.get("metadata", {})
@@ -199,16 +359,18 @@ def chat_endpoint(body: ChatQuery):
                     "category": meta.get("category", ""),
                     "url": meta.get("url", ""),
                     "image_url": meta.get("image", ""),
-                    "score": result.get("score", 0)
+                    "score": result.get("score", 0),
+                    "variants": result.get("variants", [])
                 })
             
             recommendations = [r for r in recommendations if r['score'] > 0.25]
 
             
-            # Step 4: Return combined response
+            # Step 3: Return combined response
             return {
                 "answer": chat_data.get("response", "Here are some products I found for you!"),
-                "recommendations": recommendations
+                "recommendations": recommendations,
+                "served_by": chat_data.get("served_by", "llm")
             }
             
     except Exception as e:
@@ -220,18 +382,16 @@ def chat_endpoint(body: ChatQuery):
 
 
 @app.get("/{filename}")
-async def serve_root_files(filename: str):
-    if static_dir.exists():
-        # Check root level first
-        file_path = static_dir / filename
-        if file_path.exists() and file_path.is_file():
-            return FileResponse(file_path)
-            
+async def serve_root_files(filename: str, request: Request):
+    # Root-level build files (favicon.ico, manifest.json, ...)
+    asset = static_manifest.lookup(filename)
+    if asset is not None:
+        return static_manifest.respond(request, asset)
 
-    if "." in filename:
+    if "." in filename or not static_manifest.enabled:
          # It's likely a file request, return 404 if not found
-         return {"detail": "Not Found"}
-    return FileResponse("static/index.html")
+         return JSONResponse({"detail": "Not Found"}, status_code=404)
+    return static_manifest.respond_index(request)
 
 
 
@@ -242,15 +402,42 @@ async def trigger_scrape(background_tasks: BackgroundTasks):
     return {"message": "Scraping and syncing started in background"}
 
 @app.post("/force-resync")
-async def force_resync(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def force_resync(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    source: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Reset sync status for all products and trigger re-sync.
     Use this if HF Space was restarted/cleared.
+    With ?source=Traya only that store's vector partition is dropped and rebuilt.
     """
-    db.query(models.Product).update({models.Product.synced_at: None})
-    db.commit()
+    if source is None:
+        await db.execute(update(models.Product).values(synced_at=None))
+        await db.commit()
+        background_tasks.add_task(scrape_and_sync_task)
+        return {"message": "Sync status reset. Full re-sync started in background."}
+
+    headers = metrics.upstream_headers(request)
+    if RAG_ADMIN_TOKEN:
+        headers["X-Admin-Token"] = RAG_ADMIN_TOKEN
+    try:
+        async with httpx.AsyncClient(timeout=30, headers=headers) as client:
+            with stage(UPSTREAM_LATENCY, "hf_partitions", target="partitions"):
+                response = await client.delete(f"{HF_PARTITIONS_URL}/{source}")
+    except Exception as e:
+        return {"error": f"Could not drop partition for {source}: {e}"}
+    if response.status_code != 200:
+        # Vectors are still there, so leave the sync state alone
+        return {"error": f"Could not drop partition for {source}: HTTP {response.status_code} {response.text}"}
+
+    await db.execute(
+        update(models.Product).where(models.Product.source == source).values(synced_at=None)
+    )
+    await db.commit()
     background_tasks.add_task(scrape_and_sync_task)
-    return {"message": "Sync status reset. Full re-sync started in background."}
+    return {"message": f"Partition for {source} dropped. Re-sync started in background."}
 
 @app.on_event("startup")
 async def startup_event():
@@ -262,16 +449,25 @@ async def scrape_and_sync_task():
     """
     Orchestrator: Runs scraper -> Syncs to RAG
     """
+    # Serve suggestions and facets from the existing catalog while the scrape runs
+    await asyncio.to_thread(refresh_suggest_index)
+    await asyncio.to_thread(refresh_facet_table)
+
     print(" [Task] Starting Scraper...")
-    await run_all_scrapers()
+    await run_all_scrapers()  # refreshes the facets itself
+    await asyncio.to_thread(refresh_suggest_index)
     print(" [Task] Scraper finished. Starting RAG Sync...")
     
     # Start Sync Process using a new DB session
-    db = SessionLocal()
+    db = AsyncSessionLocal()
+    synced = 0
+    started = time.perf_counter()
     try:
         while True:
             # Fetch unsynced products in batches of 10
-            products = db.query(models.Product).filter(models.Product.synced_at == None).limit(10).all()
+            products = (await db.scalars(
+                select(models.Product).where(models.Product.synced_at == None).limit(10)
+            )).all()
             
             if not products:
                 print(" [Task] All products synced to RAG!")
@@ -287,18 +483,24 @@ async def scrape_and_sync_task():
                     "features": p.features,
                     "category": p.category,
                     "url": p.url,
-                    "image_url": p.images.split(",")[0] if p.images else ""
+                    "image_url": p.images.split(",")[0] if p.images else "",
+                    "source": p.source
                 }
 
                 try:
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        response = await client.post(HF_RAG_URL, json=payload)
+                    async with httpx.AsyncClient(timeout=30, headers=metrics.upstream_headers()) as client:
+                        with stage(UPSTREAM_LATENCY, "hf_index", target="index-product"):
+                            response = await client.post(HF_RAG_URL, json=payload)
                         if response.status_code == 200:
                             p.synced_at = datetime.utcnow()
-                            db.commit()
+                            await db.commit()
+                            synced += 1
+                            SYNC_ITEMS.labels("ok").inc()
                         else:
+                            SYNC_ITEMS.labels("failed").inc()
                             print(f" Failed to sync {p.id}: {response.status_code}")
                 except Exception as e:
+                    SYNC_ITEMS.labels("error").inc()
                     print(f" Error syncing {p.id}: {e}")
                 
                 # Rate limit (2s delay)
@@ -310,4 +512,6 @@ async def scrape_and_sync_task():
     except Exception as e:
         print(f"❌ [Task] Sync process failed: {e}")
     finally:
-        db.close()
+        await db.close()
+        if synced:
+            SYNC_ITEMS_PER_SECOND.set(synced / (time.perf_counter() - started))
@@ -0,0 +1,95 @@
+"""
+Prometheus metrics and request-id tracking for the backend.
+
+Stage timings are recorded into histograms and also collected per request,
+so the access log line for a request shows where its time went. The same
+request id is forwarded to the RAG service in the X-Request-ID header.
+"""
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import event
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Per-request state: {"id": ..., "stages": {name: seconds}}
+_request_ctx = contextvars.ContextVar("request_ctx", default=None)
+
+REQUEST_LATENCY = Histogram(
+    "backend_request_seconds", "End-to-end HTTP request latency", ["method", "route"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "backend_upstream_http_seconds", "Latency of calls to the RAG service", ["target"]
+)
+DB_LATENCY = Histogram(
+    "backend_db_query_seconds", "Database statement latency", ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+SCRAPE_PAGES = Counter("scrape_pages_total", "Catalog pages fetched", ["source"])
+SCRAPE_PRODUCTS = Counter("scrape_products_total", "Products saved by the scraper", ["source"])
+SCRAPE_PAGES_PER_SECOND = Gauge(
+    "scrape_pages_per_second", "Page throughput of the last scrape run", ["source"]
+)
+SYNC_ITEMS = Counter("sync_items_total", "Products pushed to the RAG index", ["status"])
+SYNC_ITEMS_PER_SECOND = Gauge("sync_items_per_second", "Throughput of the last RAG sync run")
+
+
+def new_request(request_id=None):
+    ctx = {"id": request_id or uuid.uuid4().hex, "stages": {}}
+    _request_ctx.set(ctx)
+    return ctx
+
+
+def current_request_id():
+    ctx = _request_ctx.get()
+    return ctx["id"] if ctx else None
+
+
+def upstream_headers(request=None):
+    """Headers to attach to calls into the RAG service."""
+    rid = getattr(request.state, "request_id", None) if request is not None else None
+    rid = rid or current_request_id()
+    return {REQUEST_ID_HEADER: rid} if rid else {}
+
+
+def _record(name, elapsed):
+    ctx = _request_ctx.get()
+    if ctx is not None:
+        ctx["stages"][name] = ctx["stages"].get(name, 0.0) + elapsed
+
+
+@contextmanager
+def stage(histogram, name, **labels):
+    """Time a block into histogram and into the current request's stage log."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(**labels).observe(elapsed)
+        _record(name, elapsed)
+
+
+def format_stages(ctx):
+    return " ".join(f"{name}={secs * 1000:.1f}ms" for name, secs in ctx["stages"].items())
+
+
+def instrument_engine(engine):
+    """Time every statement run through a SQLAlchemy engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip().split(" ", 1)[0].upper()
+        DB_LATENCY.labels(verb).observe(elapsed)
+        _record("db", elapsed)
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
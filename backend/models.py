@@ -1,21 +1,58 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+import re
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Index
+from sqlalchemy.orm import validates, column_property
 from datetime import datetime
 from database import Base
 
+_price_re = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_price(price):
+    """Numeric value of a stored price string ("1299", "₹1,299.00"), or None"""
+    if not price:
+        return None
+    match = _price_re.search(str(price).replace(",", ""))
+    return float(match.group()) if match else None
+
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (Index("ix_products_category_source", "category", "source"),)
 
     id = Column(Integer, primary_key=True, index=True)
     url = Column(Text)
     title = Column(Text)
     price = Column(String(50))
+    price_value = Column(Float, nullable=True, index=True)
     description = Column(Text)
     features = Column(Text)
     images = Column(Text)
-    category = Column(String(200))
-    source = Column(String(50))
+    # active_history: load the old value on change, even on an expired
+    # instance, so facets.py can tell which group a product left
+    category = column_property(Column(String(200)), active_history=True)
+    source = column_property(Column(String(50)), active_history=True)
     
  
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    synced_at = Column(DateTime, nullable=True)  
\ No newline at end of file
+    synced_at = Column(DateTime, nullable=True)
+
+    @validates("price")
+    def _set_price_value(self, key, price):
+        # Keep the numeric copy in step with the display string
+        self.price_value = parse_price(price)
+        return price
+
+
+class ProductFacet(Base):
+    """Per (category, source) counts and price range, maintained by facets.py"""
+    __tablename__ = "product_facets"
+
+    category = Column(String(200), primary_key=True)
+    source = Column(String(50), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    priced_count = Column(Integer, nullable=False, default=0)
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+    price_sum = Column(Float, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=False)  
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+Read-through cache for product detail and listing responses.
+
+Entries hold the serialized JSON body and its ETag, bounded by total bytes
+with LRU eviction. Invalidation is driven by SQLAlchemy session events, so
+any commit in this process that inserts, updates or deletes a Product
+(save_product, add-product, RAG sync, bulk updates) drops exactly the
+entries that could contain it. Writes from other processes (the scraper
+and sync services) are bounded by PRODUCT_CACHE_TTL.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from prometheus_client import Counter, Gauge
+from models import Product
+
+PRODUCT_CACHE_MAX_BYTES = int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+
+CACHE_REQUESTS = Counter("product_cache_requests_total", "Product cache lookups", ["kind", "result"])
+CACHE_BYTES = Gauge("product_cache_bytes", "Bytes of serialized JSON held by the product cache")
+NOT_MODIFIED = Counter("product_cache_not_modified_total", "Responses answered with 304 via If-None-Match")
+
+_COLUMNS = [c.name for c in Product.__table__.columns]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+def serialize_product(product):
+    return {name: getattr(product, name) for name in _COLUMNS}
+
+
+class Entry:
+    __slots__ = ("body", "etag", "created", "ids", "max_id", "tail")
+
+    def __init__(self, body, ids, tail):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.created = time.monotonic()
+        self.ids = ids
+        self.max_id = max(ids) if ids else 0
+        self.tail = tail
+
+
+class ProductCache:
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def get(self, key):
+        kind = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels(kind, "hit" if entry else "miss").inc()
+        return entry
+
+    def put(self, key, payload, ids, tail, generation):
+        """
+        Store a freshly loaded payload. Skipped if any invalidation ran since
+        the caller read `generation`, since the rows may predate that write.
+        """
+        body = json.dumps(payload, default=_default, separators=(",", ":")).encode()
+        entry = Entry(body, frozenset(ids), tail)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+            CACHE_BYTES.set(self._bytes)
+        return entry
+
+    def invalidate(self, changes):
+        """changes: {product id: "insert" | "update" | "delete"}"""
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                entry = self._entries[key]
+                for pid, kind in changes.items():
+                    if pid in entry.ids:
+                        stale = True
+                    elif kind == "update":
+                        stale = False
+                    else:
+                        # Inserts/deletes shift rows in id-ordered pages after them
+                        stale = key[0] == "list" and (entry.tail or pid <= entry.max_id)
+                    if stale:
+                        self._drop(key)
+                        break
+            CACHE_BYTES.set(self._bytes)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+            CACHE_BYTES.set(0)
+
+
+product_cache = ProductCache(PRODUCT_CACHE_MAX_BYTES, PRODUCT_CACHE_TTL)
+
+
+def respond(request, entry):
+    """JSON response for a cache entry, or 304 when the client already has it."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if entry.etag in tags or "*" in tags:
+            NOT_MODIFIED.inc()
+            return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# --------------------------
+# Write invalidation
+# --------------------------
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault("product_changes", {})
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changes[obj.id] = "insert"
+    for obj in session.dirty:
+        if isinstance(obj, Product) and obj.id not in changes:
+            changes[obj.id] = "update"
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changes[obj.id] = "delete"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Product:
+            orm_execute_state.session.info["product_bulk_change"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate(session):
+    changes = session.info.pop("product_changes", None)
+    if session.info.pop("product_bulk_change", False):
+        product_cache.clear()
+    elif changes:
+        product_cache.invalidate(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("product_changes", None)
+    session.info.pop("product_bulk_change", None)
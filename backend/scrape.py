@@ -1,39 +1,27 @@
 import asyncio
-import requests
-import json
-import re
-from asgiref.sync import sync_to_async
+import os
+import time
+from collections import deque
+import httpx
+import ijson
+from sqlalchemy import select
 from models import Product
-from database import SessionLocal
+from database import AsyncSessionLocal
+from metrics import SCRAPE_PAGES, SCRAPE_PRODUCTS, SCRAPE_PAGES_PER_SECOND
+from text_normalize import normalize_descriptions
+from facets import refresh_facet_table
 
+# Politeness delay between catalog pages (set to 0 for local benchmarks)
+PAGE_DELAY_SECONDS = float(os.getenv("SCRAPE_PAGE_DELAY", "1"))
 
-def clean_html(raw_html):
-    """Remove HTML tags, scripts, and styles to get clean text"""
-    if not raw_html:
-        return ""
-    
-    # Remove script and style elements content
-    cleanr = re.compile('<script.*?>.*?</script>', re.DOTALL)
-    cleantext = re.sub(cleanr, '', raw_html)
-    
-    cleanr = re.compile('<style.*?>.*?</style>', re.DOTALL)
-    cleantext = re.sub(cleanr, '', cleantext)
-    
-    # Remove HTML tags
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', cleantext)
-    
-    # Replace HTML entities
-    cleantext = cleantext.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-    
-    return " ".join(cleantext.split()) 
-
+# Products per description-normalization batch
+NORMALIZE_BATCH_SIZE = int(os.getenv("SCRAPE_NORMALIZE_BATCH", "32"))
 
 
-def save_product(db, url, source, title, price, description, images, category, features):
-    """Synchronous function to save product to database"""
+async def save_product(db, url, source, title, price, description, images, category, features):
+    """Upsert a product by URL on the async session"""
     try:
-        existing = db.query(Product).filter(Product.url == url).first()
+        existing = await db.scalar(select(Product).where(Product.url == url).limit(1))
         if existing:
             # Update existing product
             existing.source = source
@@ -56,97 +44,182 @@ def save_product(db, url, source, title, price, description, images, category, f
                 features=features
             )
             db.add(new_product)
-        db.commit()
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f" Database error: {e}")
 
 
+class ProductExtractor:
+    """
+    Builds slim product records from ijson parse events of a Shopify
+    products.json page. Only the fields the scraper uses are kept, so
+    variants, options and full image objects are never materialized.
+    """
+
+    PREFIX = "products.item"
+    SCALARS = {"title", "handle", "body_html", "product_type"}
+
+    def __init__(self):
+        self.current = None
+        self.ready = deque()
+
+    def feed(self, events):
+        for prefix, event, value in events:
+            if prefix == self.PREFIX:
+                if event == "start_map":
+                    self.current = {"tags": [], "images": [], "price": None}
+                elif event == "end_map":
+                    self.ready.append(self.current)
+                    self.current = None
+                continue
+            if self.current is None or not prefix.startswith(self.PREFIX):
+                continue
+
+            field = prefix[len(self.PREFIX) + 1:]
+            if field in self.SCALARS:
+                self.current[field] = value
+            elif field == "tags.item" or (field == "tags" and event == "string"):
+                self.current["tags"].append(value)
+            elif field == "images.item.src":
+                self.current["images"].append(value)
+            elif field == "variants.item.price" and self.current["price"] is None:
+                self.current["price"] = value
+
+
+async def iter_products(response):
+    """Yield products from a streaming response as soon as each one is parsed"""
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events)
+    extractor = ProductExtractor()
+
+    async for chunk in response.aiter_bytes():
+        parser.send(chunk)
+        extractor.feed(events)
+        del events[:]
+        while extractor.ready:
+            yield extractor.ready.popleft()
+
+    parser.close()
+    extractor.feed(events)
+    while extractor.ready:
+        yield extractor.ready.popleft()
+
+
+def normalize_price(raw_price):
+    if raw_price is None:
+        return "0"
+    try:
+        price_float = float(raw_price)
+        return str(int(price_float)) if price_float.is_integer() else str(price_float)
+    except (TypeError, ValueError):
+        return str(raw_price)
+
+
+async def save_batch(db, site_name, base_url, default_category, records):
+    """Normalize descriptions for a batch of extracted products, then save them"""
+    descriptions = await normalize_descriptions([p.get("body_html") or "" for p in records])
+    saved = 0
+
+    for p, description in zip(records, descriptions):
+        try:
+            title = p.get("title")
+            handle = p.get("handle")
+            product_url = f"{base_url}/products/{handle}"
+            
+            # Images
+            images_str = ", ".join(p["images"]) # Store all images
+            
+            # Price (from first variant)
+            price = normalize_price(p["price"])
+            if price == "0":
+                continue
+
+            # Category & Features
+            category = p.get("product_type") or default_category
+            features = ", ".join(p["tags"])
+
+            # Save to DB
+            await save_product(
+                db=db,
+                url=product_url,
+                source=site_name,
+                title=title,
+                price=price,
+                description=description,
+                images=images_str,
+                category=category,
+                features=features
+            )
+            saved += 1
+            SCRAPE_PRODUCTS.labels(site_name).inc()
+            print(f" [{site_name}] Saved: {title[:30]}... (₹{price})")
+            
+        except Exception as e:
+            print(f" [{site_name}] Error processing product: {e}")
+            continue
+
+    return saved
+
+
 async def scrape_shopify_site(site_name, base_url, default_category, limit_per_page=250):
-    print(f"\n🔵 [{site_name}] Starting scrape via JSON API (Paginated)...")
+    print(f"\n🔵 [{site_name}] Starting scrape via JSON API (Paginated, streaming)...")
     
     page = 1
     saved_count = 0
-    db = SessionLocal()
+    busy_seconds = 0.0  # fetch + parse + save time, excluding the politeness delay
+    db = AsyncSessionLocal()
+    client = httpx.AsyncClient(headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
     
     try:
         while True:
             api_url = f"{base_url}/products.json?limit={limit_per_page}&page={page}"
             print(f" [{site_name}] Fetching page {page}...")
+            page_started = time.perf_counter()
+            page_count = 0
             
-            response = await asyncio.to_thread(requests.get, api_url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
-            
-            if response.status_code != 200:
-                print(f" [{site_name}] Failed to fetch page {page}: {response.status_code}")
-                break
-
-            data = response.json()
-            products = data.get("products", [])
+            async with client.stream("GET", api_url) as response:
+                if response.status_code != 200:
+                    print(f" [{site_name}] Failed to fetch page {page}: {response.status_code}")
+                    break
+                SCRAPE_PAGES.labels(site_name).inc()
+
+                # Products are batched for normalization and saved while the
+                # rest of the page is still downloading; one batch in flight
+                batch = []
+                pending = None
+                try:
+                    async for p in iter_products(response):
+                        page_count += 1
+                        batch.append(p)
+                        if len(batch) >= NORMALIZE_BATCH_SIZE:
+                            if pending is not None:
+                                saved_count += await pending
+                            pending = asyncio.ensure_future(save_batch(db, site_name, base_url, default_category, batch))
+                            batch = []
+                finally:
+                    # Even if the page broke off, let the in-flight batch finish
+                    # before the session is closed
+                    if pending is not None:
+                        saved_count += await pending
+                if batch:
+                    saved_count += await save_batch(db, site_name, base_url, default_category, batch)
             
-            if not products:
+            if not page_count:
                 print(f" [{site_name}] No more products found at page {page}.")
                 break
             
-            print(f"[{site_name}] Page {page}: Found {len(products)} products")
-            
-            for p in products:
-                try:
-                    title = p.get("title")
-                    handle = p.get("handle")
-                    product_url = f"{base_url}/products/{handle}"
-                    
-                    # Description
-                    body_html = p.get("body_html", "")
-                    description = clean_html(body_html)
-                    
-                    # Images
-                    images_list = [img.get("src") for img in p.get("images", [])]
-                    images_str = ", ".join(images_list) # Store all images
-                    
-                    # Price (from first variant)
-                    variants = p.get("variants", [])
-                    price = "0"
-                    if variants:
-                        raw_price = variants[0].get("price", "0")
-                        try:
-                            price_float = float(raw_price)
-                            price = str(int(price_float)) if price_float.is_integer() else str(price_float)
-                        except:
-                            price = raw_price
-                    
-                    if price == "0":
-                        continue
-
-                    # Category & Features
-                    category = p.get("product_type") or default_category
-                    features = ", ".join(p.get("tags", [])) if p.get("tags") else ""
-
-                    # Save to DB
-                    await sync_to_async(save_product)(
-                        db=db,
-                        url=product_url,
-                        source=site_name,
-                        title=title,
-                        price=price,
-                        description=description[:1000],
-                        images=images_str,
-                        category=category,
-                        features=features
-                    )
-                    saved_count += 1
-                    print(f" [{site_name}] Saved: {title[:30]}... (₹{price})")
-                    
-                except Exception as e:
-                    print(f" [{site_name}] Error processing product: {e}")
-                    continue
-            
+            print(f"[{site_name}] Page {page}: Processed {page_count} products")
+            busy_seconds += time.perf_counter() - page_started
+            SCRAPE_PAGES_PER_SECOND.labels(site_name).set(page / busy_seconds)
             page += 1
-            await asyncio.sleep(1) 
+            await asyncio.sleep(PAGE_DELAY_SECONDS)
             
     except Exception as e:
         print(f" [{site_name}] Fatal error: {e}")
     finally:
-        db.close()
+        await client.aclose()
+        await db.close()
         
     print(f" [{site_name}] Completed - {saved_count} products saved.")
 
@@ -164,6 +237,9 @@ async def run_all_scrapers():
     # Scrape Hunnit
     await scrape_shopify_site("Hunnit", "https://www.hunnit.com", "Clothing")
     
+    # Browse facets for the groups the scrape touched
+    await asyncio.to_thread(refresh_facet_table)
+    
     print("\n" + "=" * 60)
     print("🎉 All scrapers completed!")
 
@@ -8,6 +8,7 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pytz
 from scrape import run_all_scrapers
+from database import async_engine
 import httpx
 
 # Configuration
@@ -38,11 +39,24 @@ async def run_scraper_job():
                     print(f"⚠️ Sync trigger returned status {response.status_code}")
         except Exception as sync_error:
             print(f"⚠️ Could not trigger sync (sync service should handle this): {sync_error}")
+
+        # The backend keeps its typeahead index in memory; have it pick up the new catalog
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                response = await client.post("http://backend:8000/suggest/refresh")
+                if response.status_code != 200:
+                    print(f"⚠️ Suggest refresh returned status {response.status_code}")
+        except Exception as refresh_error:
+            print(f"⚠️ Could not refresh suggestions: {refresh_error}")
         
     except Exception as e:
         print(f"\n❌ Scraper job failed: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # Each run gets a fresh event loop (asyncio.run); asyncpg connections
+        # can't outlive the loop that opened them, so empty the pool now.
+        await async_engine.dispose()
     
     print(f"\n{'='*60}")
     print(f"🏁 Scraper Job Finished at {datetime.now()}")
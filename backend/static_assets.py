@@ -0,0 +1,121 @@
+"""
+Serving for the React build in static/.
+
+The directory is scanned once at startup into a manifest: content type,
+strong ETag and any .br/.gz siblings produced at build time. Requests are
+then answered without touching the filesystem metadata, with the best
+encoding the client accepts. Fingerprinted files (main.1a2b3c4d.js) are
+served as immutable; index.html is held in memory for SPA fallbacks.
+"""
+import re
+import hashlib
+import mimetypes
+from pathlib import Path
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+# CRA fingerprints: main.1a2b3c4d.js, 123.abcd1234.chunk.js, logo.<32 hex>.svg
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.(?:chunk\.)?[a-z0-9]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Preference order when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _etag(path):
+    digest = hashlib.blake2b(digest_size=12)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return '"' + digest.hexdigest() + '"'
+
+
+def accepted_encodings(header):
+    """Encodings with a non-zero q-value from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class Asset:
+    __slots__ = ("path", "content_type", "etag", "cache_control", "variants", "body")
+
+    def __init__(self, path, cache_control):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        self.etag = _etag(path)
+        self.cache_control = cache_control
+        self.variants = {}  # encoding -> (path, etag)
+        self.body = None    # only set for in-memory assets (index.html)
+        for encoding, suffix in ENCODINGS:
+            compressed = path.with_name(path.name + suffix)
+            if compressed.is_file():
+                self.variants[encoding] = (compressed, _etag(compressed))
+
+
+class StaticManifest:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.assets = {}
+        self.index = None
+        if self.root.is_dir():
+            self._scan()
+
+    @property
+    def enabled(self):
+        return self.index is not None
+
+    def _scan(self):
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for path in self.root.rglob("*"):
+            if not path.is_file() or path.name.endswith(suffixes):
+                continue
+            rel = path.relative_to(self.root).as_posix()
+            cache = IMMUTABLE if HASHED_NAME.search(path.name) else REVALIDATE
+            self.assets[rel] = Asset(path, cache)
+
+        index = self.assets.get("index.html")
+        if index is not None:
+            index.body = {None: index.path.read_bytes()}
+            for encoding, (variant, _) in index.variants.items():
+                index.body[encoding] = variant.read_bytes()
+            self.index = index
+
+        print(f" [Static] Manifest built: {len(self.assets)} assets")
+
+    def lookup(self, rel_path):
+        return self.assets.get(rel_path.lstrip("/"))
+
+    def respond(self, request, asset):
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        encoding = next((e for e, _ in ENCODINGS if e in asset.variants and e in accepted), None)
+        etag = asset.variants[encoding][1] if encoding else asset.etag
+
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in {t.strip() for t in if_none_match.split(",")}:
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if asset.body is not None:
+            return Response(content=asset.body[encoding], media_type=asset.content_type, headers=headers)
+        path = asset.variants[encoding][0] if encoding else asset.path
+        return FileResponse(path, media_type=asset.content_type, headers=headers)
+
+    def respond_index(self, request):
+        return self.respond(request, self.index)
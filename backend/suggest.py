@@ -0,0 +1,174 @@
+"""
+Typeahead suggestions built from the product catalog.
+
+Phrases (titles, categories and feature tags) are kept in a sorted array of
+normalized keys, one key per word boundary, so a prefix lookup is a binary
+search. Misspelled trailing words are corrected against the catalog
+vocabulary with a precomputed single-edit delete map.
+"""
+import re
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from models import Product
+
+MIN_FUZZY_LEN = 3
+
+# Higher weight ranks first when several phrases share a prefix
+KIND_WEIGHT = {"title": 3, "category": 2, "tag": 1}
+
+_token_re = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    return " ".join(_token_re.findall(text.lower()))
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def product_phrases(product):
+    """(phrase, kind) pairs contributed by one product row"""
+    phrases = set()
+    if product.title:
+        phrases.add((product.title.strip(), "title"))
+    if product.category:
+        phrases.add((product.category.strip(), "category"))
+    if product.features:
+        for tag in product.features.split(","):
+            tag = tag.strip()
+            if tag:
+                phrases.add((tag, "tag"))
+    return phrases
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # startup task vs POST /suggest/refresh
+        self._by_product = {}   # product id -> set of (phrase, kind)
+        self._refcount = {}     # (phrase, kind) -> number of products using it
+        self._keys = []         # sorted normalized keys
+        self._key_entries = []  # parallel to _keys: (phrase, kind, starts_at_beginning)
+        self._fuzzy = {}        # word prefix or single delete of one -> vocabulary words
+        self.built_at = None
+
+    # --------------------------
+    # Building
+    # --------------------------
+    def _apply(self, product_id, phrases):
+        old = self._by_product.get(product_id, set())
+        if old == phrases:
+            return False
+        for item in old - phrases:
+            self._refcount[item] -= 1
+            if not self._refcount[item]:
+                del self._refcount[item]
+        for item in phrases - old:
+            self._refcount[item] = self._refcount.get(item, 0) + 1
+        self._by_product[product_id] = phrases
+        return True
+
+    def _rebuild_arrays(self):
+        pairs = []
+        vocab = set()
+        for phrase, kind in self._refcount:
+            words = normalize(phrase).split()
+            vocab.update(words)
+            for i in range(len(words)):
+                pairs.append((" ".join(words[i:]), phrase, kind, i == 0))
+        pairs.sort()
+
+        fuzzy = {}
+        for word in vocab:
+            for end in range(MIN_FUZZY_LEN, len(word) + 1):
+                prefix = word[:end]
+                for variant in _deletes(prefix) | {prefix}:
+                    fuzzy.setdefault(variant, set()).add(word)
+
+        keys = [p[0] for p in pairs]
+        entries = [(p[1], p[2], p[3]) for p in pairs]
+        with self._lock:
+            self._keys, self._key_entries, self._fuzzy = keys, entries, fuzzy
+
+    def refresh(self, db):
+        """
+        Pick up products changed or deleted since the last refresh.
+        The first call loads the whole catalog.
+        """
+        with self._refresh_lock:
+            started = datetime.utcnow()
+            query = db.query(Product.id, Product.title, Product.category, Product.features)
+            if self.built_at is not None:
+                query = query.filter(Product.updated_at >= self.built_at)
+
+            changed = False
+            for row in query.all():
+                changed |= self._apply(row.id, product_phrases(row))
+
+            if self.built_at is not None:
+                # Deleted rows never show up as updated, so diff the id sets
+                current = {pid for (pid,) in db.query(Product.id).all()}
+                for pid in [pid for pid in self._by_product if pid not in current]:
+                    changed |= self._apply(pid, set())
+                    del self._by_product[pid]
+
+            if changed or self.built_at is None:
+                self._rebuild_arrays()
+            self.built_at = started
+            return changed
+
+    # --------------------------
+    # Lookup
+    # --------------------------
+    def _prefix(self, prefix, limit, seen, out):
+        with self._lock:
+            keys, entries = self._keys, self._key_entries
+        candidates = []
+        i = bisect_left(keys, prefix)
+        # Scan a bounded window so very short prefixes stay cheap
+        while i < len(keys) and keys[i].startswith(prefix) and len(candidates) < limit * 20:
+            phrase, kind, at_start = entries[i]
+            candidates.append((-KIND_WEIGHT[kind], not at_start, len(phrase), phrase, kind))
+            i += 1
+        candidates.sort()
+        for _, _, _, phrase, kind in candidates:
+            if len(out) >= limit:
+                break
+            if phrase.lower() in seen:
+                continue
+            seen.add(phrase.lower())
+            out.append({"text": phrase, "type": kind})
+
+    def _corrections(self, word):
+        with self._lock:
+            fuzzy = self._fuzzy
+        found = set(fuzzy.get(word, ()))
+        for variant in _deletes(word):
+            found |= fuzzy.get(variant, set())
+        return sorted(found, key=lambda w: (abs(len(w) - len(word)), w))
+
+    def suggest(self, q, limit=8):
+        query = normalize(q)
+        if not query:
+            return []
+
+        out, seen = [], set()
+        self._prefix(query, limit, seen, out)
+
+        words = query.split()
+        last = words[-1]
+        if len(out) < limit and len(last) >= MIN_FUZZY_LEN:
+            head = " ".join(words[:-1])
+            for word in self._corrections(last):
+                if word == last:
+                    continue
+                corrected = f"{head} {word}" if head else word
+                self._prefix(corrected, limit, seen, out)
+                if len(out) >= limit:
+                    break
+        return out
+
+
+suggest_index = SuggestIndex()
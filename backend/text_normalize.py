@@ -0,0 +1,105 @@
+"""
+HTML-to-text normalization for scraped product descriptions.
+
+One precompiled regex pass drops tags and script/style bodies (block-level
+tags become a space so words on either side don't run together), then
+html.unescape decodes every named and numeric entity and whitespace is
+collapsed. Descriptions are truncated, so only as much of the document as
+is needed to fill them is converted. Batches can be run on a process pool
+so large body_html pages don't stall the scraper's event loop.
+"""
+import os
+import re
+import asyncio
+from html import unescape
+from concurrent.futures import ProcessPoolExecutor
+
+DESCRIPTION_MAX_CHARS = 1000
+
+# 0 = normalize inline (single-core hosts); defaults to a small pool otherwise
+TEXT_WORKERS = int(os.getenv("TEXT_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+
+# Batches smaller than this aren't worth the inter-process round trip
+MIN_POOL_BATCH = 8
+
+BLOCK_TAGS = frozenset(
+    "address article aside blockquote br dd div dl dt figcaption figure footer "
+    "h1 h2 h3 h4 h5 h6 header hr li main nav ol p pre section table tbody td "
+    "tfoot th thead tr ul".split()
+)
+
+_markup = re.compile(
+    r"<(script|style)\b[^>]*>.*?</\1\s*>"   # script/style including their contents
+    r"|<!--.*?-->"                          # comments
+    r"|</?([a-zA-Z][a-zA-Z0-9]*)[^>]*>",    # any other tag
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+def _replace(match):
+    tag = match.group(2)
+    if tag is not None and tag.lower() in BLOCK_TAGS:
+        return " "
+    return ""
+
+
+def html_to_text(raw_html):
+    """Plain text of an HTML fragment with entities decoded and whitespace collapsed"""
+    if not raw_html:
+        return ""
+    return " ".join(unescape(_markup.sub(_replace, raw_html)).split())
+
+
+def _safe_cut(raw_html, window):
+    """
+    End of a prefix of at most `window` chars that stops right after a tag
+    and inside no script/style/comment, or -1 if there is none.
+    """
+    cut = raw_html.rfind(">", 0, window) + 1
+    if cut <= 0:
+        return -1
+    head = raw_html[:cut].lower()
+    for opener, closer in (("<script", "</script"), ("<style", "</style"), ("<!--", "-->")):
+        if head.rfind(opener) > head.rfind(closer):
+            return -1
+    return cut
+
+
+def normalize_description(raw_html, max_chars=DESCRIPTION_MAX_CHARS):
+    """
+    html_to_text(raw_html)[:max_chars], without cleaning the whole document:
+    growing prefixes are converted until they yield enough text.
+    """
+    if not raw_html:
+        return ""
+    window = max_chars * 2
+    while window < len(raw_html):
+        cut = _safe_cut(raw_html, window)
+        if cut > 0:
+            text = html_to_text(raw_html[:cut])
+            if len(text) > max_chars:
+                return text[:max_chars]
+        window *= 2
+    return html_to_text(raw_html)[:max_chars]
+
+
+def normalize_batch(raw_htmls):
+    return [normalize_description(raw) for raw in raw_htmls]
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=TEXT_WORKERS)
+    return _pool
+
+
+async def normalize_descriptions(raw_htmls):
+    """Normalize a batch off the event loop (process pool, or inline when disabled)"""
+    if TEXT_WORKERS <= 0 or len(raw_htmls) < MIN_POOL_BATCH:
+        return normalize_batch(raw_htmls)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), normalize_batch, raw_htmls)
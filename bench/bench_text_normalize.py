@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for description normalization: the previous regex
+clean_html against text_normalize, inline and on the process pool.
+
+Golden cases are checked first, so this doubles as a quick correctness
+gate when touching text_normalize.
+
+    python bench/bench_text_normalize.py --products 2000
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "backend"), str(Path(__file__).resolve().parent)]
+
+import text_normalize  # noqa: E402
+from fakes import make_catalog  # noqa: E402
+
+GOLDEN = [
+    ("", ""),
+    (None, ""),
+    ("plain text", "plain text"),
+    ("<p>Soft</p><p>Stretchy</p>", "Soft Stretchy"),
+    ("<strong>Bold</strong>er", "Bolder"),
+    ("Line<br>break<br/>here", "Line break here"),
+    ("<ul><li>One</li><li>Two</li></ul>", "One Two"),
+    ("<script>var x = '<p>';</script>Shown", "Shown"),
+    ("<STYLE type='text/css'>.a{}</STYLE>Shown", "Shown"),
+    ("<!-- <p>hidden</p> -->Visible", "Visible"),
+    ("Tom &amp; Jerry &lt;3 &quot;q&quot; &#8377;499 &rsquo;s &eacute;", "Tom & Jerry <3 \"q\" ₹499 ’s é"),
+    ("a&nbsp;&nbsp;b \n\t c", "a b c"),
+    ("5 < 6 and 7 > 3", "5 < 6 and 7 > 3"),
+    ('<div\nclass="x">multi-line tag</div>', "multi-line tag"),
+    ("&lt;script&gt;text&lt;/script&gt;", "<script>text</script>"),
+]
+
+
+def legacy_clean_html(raw_html):
+    """clean_html as it was in scrape.py, kept here as the baseline"""
+    if not raw_html:
+        return ""
+    cleantext = re.sub(re.compile('<script.*?>.*?</script>', re.DOTALL), '', raw_html)
+    cleantext = re.sub(re.compile('<style.*?>.*?</style>', re.DOTALL), '', cleantext)
+    cleantext = re.sub(re.compile('<.*?>'), '', cleantext)
+    cleantext = cleantext.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+    return " ".join(cleantext.split())
+
+
+def check_golden():
+    failures = []
+    for raw, expected in GOLDEN:
+        got = text_normalize.html_to_text(raw)
+        if got != expected:
+            failures.append((raw, expected, got))
+    long_html = "<p>" + "word " * 500 + "</p>"
+    if len(text_normalize.normalize_description(long_html)) != text_normalize.DESCRIPTION_MAX_CHARS:
+        failures.append(("<long>", "truncated", "not truncated"))
+    for raw, expected, got in failures:
+        print(f" [golden] {raw!r}: expected {expected!r}, got {got!r}")
+    return not failures
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--paragraphs", type=int, default=40, help="body_html size per product")
+    parser.add_argument("--batch", type=int, default=32)
+    args = parser.parse_args()
+
+    if not check_golden():
+        sys.exit(1)
+    print(f" [golden] {len(GOLDEN) + 1} cases OK")
+
+    bodies = [p["body_html"] for p in make_catalog(args.products, body_paragraphs=args.paragraphs)]
+    batches = [bodies[i:i + args.batch] for i in range(0, len(bodies), args.batch)]
+    total_mb = sum(len(b) for b in bodies) / 1e6
+
+    legacy = timed(lambda: [legacy_clean_html(b)[:1000] for b in bodies])
+    inline = timed(lambda: [text_normalize.normalize_batch(b) for b in batches])
+
+    async def pooled():
+        return await asyncio.gather(*(text_normalize.normalize_descriptions(b) for b in batches))
+
+    asyncio.run(pooled())  # start the workers outside the timing
+    pool = timed(lambda: asyncio.run(pooled()))
+
+    results = {
+        "products": len(bodies),
+        "input_mb": total_mb,
+        "workers": text_normalize.TEXT_WORKERS,
+        "legacy_ms": legacy * 1000,
+        "inline_ms": inline * 1000,
+        "pool_ms": pool * 1000,
+        "inline_speedup": legacy / inline,
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
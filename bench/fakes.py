@@ -0,0 +1,113 @@
+"""
+Local stand-ins for the external services used by the benchmarks:
+a Shopify products.json server and a Gemini-compatible LLM client.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+WORDS = (
+    "yoga gym cotton stretch breathable seamless hair scalp serum oil "
+    "shampoo growth anti hairfall dry frizz leggings shorts tee bra jogger "
+    "sweat wicking lightweight soft premium everyday training run"
+).split()
+
+
+def make_catalog(count, seed=42, body_paragraphs=12):
+    """Deterministic Shopify-shaped products with realistic body_html sizes."""
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS).title() for _ in range(3)) + f" {i}"
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(40))} &amp; more&nbsp;details</p>"
+            for _ in range(body_paragraphs)
+        )
+        products.append({
+            "id": 10_000 + i,
+            "title": title,
+            "handle": f"product-{i}",
+            "body_html": f"<div><style>.x{{color:red}}</style>{paragraphs}<script>var a=1;</script></div>",
+            "product_type": rng.choice(["Leggings", "Shampoo", "Serum", "T-Shirt", ""]),
+            "tags": rng.sample(WORDS, 5),
+            "images": [{"id": j, "src": f"https://cdn.example.com/{i}/{j}.jpg", "width": 1200, "height": 1600}
+                       for j in range(rng.randint(1, 6))],
+            "variants": [{"id": j, "title": size, "price": f"{rng.randint(199, 2999)}.00",
+                          "sku": f"SKU-{i}-{j}", "available": True}
+                         for j, size in enumerate(["XS", "S", "M", "L", "XL"])],
+        })
+    return products
+
+
+class FakeShopify:
+    """Serves /products.json?limit=&page= from an in-memory catalog on a local port."""
+
+    def __init__(self, products):
+        self.products = products
+        catalog = products
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/products.json":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                qs = parse_qs(url.query)
+                limit = int(qs.get("limit", ["30"])[0])
+                page = int(qs.get("page", ["1"])[0])
+                chunk = catalog[(page - 1) * limit: page * limit]
+                body = json.dumps({"products": chunk}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeLLM:
+    """Drop-in for genai.Client: client.models.generate_content(model=, contents=)."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = self
+
+    def generate_content(self, model=None, contents="", config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        # Honour the per-request HTTP timeout the way the real client does
+        http_options = getattr(config, "http_options", None)
+        timeout = getattr(http_options, "timeout", None)
+        if timeout is not None and delay > timeout / 1000:
+            time.sleep(timeout / 1000)
+            raise TimeoutError("fake LLM request timed out")
+        time.sleep(delay)
+        return SimpleNamespace(text=f"Recommended picks ({len(contents)} chars of context).")
@@ -0,0 +1,299 @@
+"""
+Performance benchmarks for the scraper, the RAG service and the backend API.
+
+Everything external is replaced locally: a fake Shopify products.json server,
+a fake LLM with configurable latency and a throwaway SQLite database. The
+sentence-transformers model and Chroma are real, since their cost is what
+the RAG numbers are meant to capture.
+
+    python bench/run.py --out bench/results/latest.json
+    python bench/run.py --skip-rag --sizes 100,1000,10000
+
+Results are written as JSON so runs from different commits can be diffed.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakes import FakeShopify, FakeLLM, make_catalog  # noqa: E402
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+@contextlib.contextmanager
+def quiet():
+    """The services print per item; keep that out of the timings and the console."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+async def load(client, method, path, payloads, concurrency, on_response=None):
+    """Issue requests with bounded concurrency; returns per-request latencies."""
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(payload):
+        async with sem:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=payload)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+            if on_response is not None:
+                on_response(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    wall = time.perf_counter() - started
+    return {**percentiles(latencies), "throughput_rps": len(latencies) / wall, "concurrency": concurrency}
+
+
+# --------------------------
+# BACKEND: scraper + /products
+# --------------------------
+def bench_scrape(args):
+    import scrape
+    from database import Base, SessionLocal, engine
+    import models
+
+    # Normally done by importing main, which happens later in bench_products
+    Base.metadata.create_all(bind=engine)
+
+    catalog = make_catalog(args.products)
+    with FakeShopify(catalog) as shop:
+        start = time.perf_counter()
+        with quiet():
+            asyncio.run(scrape.scrape_shopify_site("Bench", shop.base_url, "Bench", limit_per_page=args.page_size))
+        elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    try:
+        saved = db.query(models.Product).count()
+    finally:
+        db.close()
+
+    return {
+        "products": len(catalog),
+        "saved": saved,
+        "page_size": args.page_size,
+        "seconds": elapsed,
+        "products_per_second": saved / elapsed,
+    }
+
+
+def seed_products(count):
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        db.query(models.Product).delete()
+        db.add_all([
+            models.Product(
+                url=f"https://bench.local/products/{i}",
+                title=f"Bench Product {i}",
+                price=str(199 + i % 2800),
+                description="Soft breathable cotton for everyday training. " * 20,
+                features="yoga, gym, cotton, stretch",
+                images=", ".join(f"https://cdn.example.com/{i}/{j}.jpg" for j in range(4)),
+                category="Leggings" if i % 2 else "Shampoo",
+                source="Traya" if i % 3 else "Hunnit",
+            )
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def bench_products(args):
+    """/products per catalog size: "cold" bypasses the product cache (DB path), "warm" serves from it."""
+    import httpx
+    import main
+
+    cache = main.product_cache
+    max_bytes = cache.max_bytes
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/products")  # warm-up (fills the cache when it is enabled)
+            return await load(client, "GET", "/products", [None] * args.list_requests, args.concurrency)
+
+    modes = ["cold", "warm"] if args.product_cache == "both" else [args.product_cache]
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = {}
+        with quiet():
+            seed_products(size)
+            for mode in modes:
+                cache.clear()
+                # Nothing fits in a zero-byte cache, so every request goes to the DB
+                cache.max_bytes = max_bytes if mode == "warm" else 0
+                results[str(size)][mode] = asyncio.run(run())
+        cache.max_bytes = max_bytes
+    return results
+
+
+# --------------------------
+# RAG: indexing, /search, /chat
+# --------------------------
+def bench_rag(args):
+    import httpx
+    sys.path.insert(0, str(ROOT / "RAG" / "AI-product"))
+    with quiet():
+        import app as rag
+    rag.client = FakeLLM(latency=args.llm_latency, jitter=args.llm_jitter)
+
+    catalog = make_catalog(args.index_products, seed=7, body_paragraphs=2)
+    products = [
+        rag.Product(
+            id=i,
+            title=p["title"],
+            description=p["body_html"][:1000],
+            features=", ".join(p["tags"]),
+            category=p["product_type"] or "Bench",
+            url=f"https://bench.local/products/{p['handle']}",
+            image_url=p["images"][0]["src"],
+            source="Traya" if i % 2 else "Hunnit",
+        )
+        for i, p in enumerate(catalog)
+    ]
+
+    start = time.perf_counter()
+    with quiet():
+        for product in products:
+            rag.index_product(product)
+    index_seconds = time.perf_counter() - start
+
+    queries = [{"query": q, "top_k": 5, "budget_ms": args.chat_budget_ms} for q in (
+        "breathable gym leggings", "dry scalp serum", "anti hairfall shampoo",
+        "soft cotton tee", "lightweight running shorts",
+    )] * (args.requests // 5)
+
+    served_by = collections.Counter()
+
+    def count_served(response):
+        served_by[response.json().get("served_by")] += 1
+
+    async def run():
+        transport = httpx.ASGITransport(app=rag.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await client.post("/search", json=queries[0])  # warm-up
+            search = await load(client, "POST", "/search", queries, args.concurrency)
+            chat = await load(client, "POST", "/chat", queries, args.concurrency, on_response=count_served)
+            return search, chat
+
+    with quiet():
+        search, chat = asyncio.run(run())
+
+    return {
+        "index": {
+            "products": len(products),
+            "seconds": index_seconds,
+            "products_per_second": len(products) / index_seconds,
+        },
+        "search": search,
+        "chat": {
+            **chat,
+            "llm_latency_ms": args.llm_latency * 1000,
+            "budget_ms": args.chat_budget_ms,
+            "served_by": dict(served_by),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=None, help="JSON results path (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--products", type=int, default=1000, help="products served by the fake Shopify store")
+    parser.add_argument("--page-size", type=int, default=250)
+    parser.add_argument("--sizes", default="100,1000,5000", help="catalog sizes for /products")
+    parser.add_argument("--list-requests", type=int, default=50)
+    parser.add_argument("--product-cache", choices=["cold", "warm", "both"], default="both",
+                        help="/products with the product cache bypassed (cold), in use (warm), or both")
+    parser.add_argument("--index-products", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=200, help="requests per RAG endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--chat-budget-ms", type=int, default=None, help="per-request /chat budget (default: CHAT_BUDGET_MS)")
+    parser.add_argument("--skip-backend", action="store_true")
+    parser.add_argument("--skip-rag", action="store_true")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    workdir = tempfile.mkdtemp(prefix="neusearch-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["SCRAPE_PAGE_DELAY"] = "0"
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    # The RAG app keeps its Chroma store relative to the working directory
+    os.chdir(workdir)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+    }
+
+    if not args.skip_backend:
+        sys.path.insert(0, str(ROOT / "backend"))
+        print(" [bench] scrape_shopify_site ...")
+        results["scrape"] = bench_scrape(args)
+        print(" [bench] GET /products ...")
+        results["products"] = bench_products(args)
+
+    if not args.skip_rag:
+        print(" [bench] index_product, /search, /chat ...")
+        results["rag"] = bench_rag(args)
+
+    out = Path(args.out) if args.out else ROOT / "bench" / "results" / f"{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    if not out.is_absolute():
+        out = ROOT / out
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f" [bench] Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ const ChatInterface = () => {
     ]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    const [suggestions, setSuggestions] = useState([]);
     const messagesEndRef = useRef(null);
 
     const scrollToBottom = () => {
@@ -18,12 +19,28 @@ const ChatInterface = () => {
 
     useEffect(scrollToBottom, [messages]);
 
+    // Typeahead from the backend's in-memory catalog index
+    useEffect(() => {
+        const q = input.trim();
+        if (q.length < 2) {
+            setSuggestions([]);
+            return;
+        }
+        const controller = new AbortController();
+        fetch(`${config.API_URL}/suggest?q=${encodeURIComponent(q)}&limit=5`, { signal: controller.signal })
+            .then(res => res.json())
+            .then(data => setSuggestions(data.suggestions || []))
+            .catch(() => {});
+        return () => controller.abort();
+    }, [input]);
+
     const handleSend = async () => {
         if (!input.trim()) return;
 
         const userMessage = { text: input, sender: 'user' };
         setMessages(prev => [...prev, userMessage]);
         setInput('');
+        setSuggestions([]);
         setLoading(true);
 
         try {
@@ -101,6 +118,16 @@ const ChatInterface = () => {
                         <div ref={messagesEndRef} />
                     </div>
 
+                    {suggestions.length > 0 && (
+                        <div className="chat-suggestions">
+                            {suggestions.map((s, sIdx) => (
+                                <button key={sIdx} className="suggestion-chip" onClick={() => setInput(s.text)}>
+                                    {s.text}
+                                </button>
+                            ))}
+                        </div>
+                    )}
+
                     <div className="chat-input">
                         <textarea
                             value={input}
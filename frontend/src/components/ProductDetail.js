@@ -8,6 +8,7 @@ const ProductDetail = () => {
     const [product, setProduct] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(false);
+    const [similar, setSimilar] = useState([]);
 
     useEffect(() => {
         setLoading(true);
@@ -31,6 +32,12 @@ const ProductDetail = () => {
                 setError(true);
                 setLoading(false);
             });
+
+        // Related items come from the precomputed neighbor table in the RAG service
+        fetch(`${config.API_URL}/products/${id}/similar`)
+            .then(res => res.json())
+            .then(data => setSimilar(data.results || []))
+            .catch(() => setSimilar([]));
     }, [id]);
 
     if (loading) return (
@@ -113,6 +120,20 @@ const ProductDetail = () => {
                     </a>
                 </div>
             </div>
+
+            {similar.length > 0 && (
+                <div className="similar-products">
+                    <h3>Similar Products</h3>
+                    <div className="recommendations">
+                        {similar.map((item) => (
+                            <Link key={item.id} to={`/product/${item.id}`} className="mini-product-card">
+                                <img src={item.image_url} alt={item.title} />
+                                <p>{item.title}</p>
+                            </Link>
+                        ))}
+                    </div>
+                </div>
+            )}
         </div>
     );
 };